@@ -0,0 +1,124 @@
+import numpy as np
+import pandas as pd
+
+import instrumentation
+
+# Janela padrão (em pregões) da volatilidade móvel e do z-score do último movimento
+DEFAULT_WINDOW = 21
+
+# Pregões por ano, para anualizar a volatilidade
+PERIODS_PER_YEAR = 252
+
+# Horizonte mínimo de histórico carregado quando as análises estão ligadas
+ANALYTICS_HISTORY = '1Y'
+
+# Observações em comum exigidas para correlacionar dois ativos
+MIN_PERIODS = 20
+
+ANALYTICS_COLUMNS = [
+    'Moeda',
+    'Volatilidade (%)',
+    'Máx. Drawdown (%)',
+    'Último Retorno (%)',
+    'Z-score',
+]
+
+
+def log_returns(values, signs):
+    # Log-retornos entre fechamentos válidos consecutivos (data x ativo), com o
+    # sinal de cada ativo: a alta sempre representa valorização. Dias sem cotação
+    # ficam NaN e o retorno seguinte cobre todo o intervalo
+    filled = pd.DataFrame(values).ffill().to_numpy()
+    returns = np.full(values.shape, np.nan)
+    returns[1:] = np.diff(np.log(filled), axis=0) * signs
+    returns[np.isnan(values)] = np.nan
+    return returns
+
+
+def rolling_std(returns, window):
+    # Desvio-padrão móvel das observações válidas nas últimas `window` datas, via
+    # somas acumuladas (sem laço por ativo). NaN com menos de 2 observações
+    valid = ~np.isnan(returns)
+    x = np.where(valid, returns, 0.0)
+    zeros = np.zeros((1, x.shape[1]))
+    count = np.cumsum(np.vstack([zeros, valid]), axis=0)
+    total = np.cumsum(np.vstack([zeros, x]), axis=0)
+    squares = np.cumsum(np.vstack([zeros, x * x]), axis=0)
+
+    lag = np.maximum(np.arange(1, len(x) + 1) - window, 0)
+    n = count[1:] - count[lag]
+    s = total[1:] - total[lag]
+    ss = squares[1:] - squares[lag]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        variance = (ss - s * s / n) / (n - 1)
+    return np.where(n >= 2, np.sqrt(np.maximum(variance, 0.0)), np.nan)
+
+
+def max_drawdown(returns):
+    # Maior queda, em fração, de um pico ao vale seguinte do índice formado pelos retornos
+    index = np.exp(np.cumsum(np.nan_to_num(returns), axis=0))
+    peak = np.maximum.accumulate(index, axis=0)
+    drawdown = (index / peak - 1).min(axis=0)
+    return np.where(np.isnan(returns).all(axis=0), np.nan, drawdown)
+
+
+def correlation_matrix(returns, min_periods=MIN_PERIODS):
+    # Correlação de Pearson entre todos os pares de ativos, usando para cada par
+    # só as datas em que ambos têm retorno. Tudo sai de quatro produtos de
+    # matrizes (BLAS), O(datas x ativos²) sem laços em Python
+    valid = (~np.isnan(returns)).astype(np.float64)
+    x = np.where(valid > 0, returns, 0.0)
+
+    n = valid.T @ valid
+    sum_x = x.T @ valid            # soma de x_i nas datas em que j também é válido
+    sum_xx = (x * x).T @ valid
+    sum_xy = x.T @ x
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        cov = sum_xy - sum_x * sum_x.T / n
+        squares = sum_xx - sum_x * sum_x / n
+        corr = cov / np.sqrt(squares * squares.T)
+    corr[n < min_periods] = np.nan
+    np.fill_diagonal(corr, np.where(np.diag(n) >= min_periods, 1.0, np.nan))
+    return np.clip(corr, -1.0, 1.0)
+
+
+def compute_analytics(panel, signs, current_date, window=DEFAULT_WINDOW, min_periods=MIN_PERIODS):
+    # Volatilidade móvel anualizada, drawdown máximo e z-score do último
+    # movimento de cada ativo, mais a matriz de correlação entre todos eles.
+    # Devolve (tabela com ANALYTICS_COLUMNS, DataFrame ticker x ticker)
+    today = pd.Timestamp(current_date.date())
+    panel = panel[panel.index < today].sort_index()
+    tickers = list(panel.columns)
+    values = panel.to_numpy(dtype=np.float64)
+    signs = np.asarray(signs, dtype=np.float64)
+
+    if len(panel) < 2:
+        return pd.DataFrame(columns=ANALYTICS_COLUMNS), pd.DataFrame(index=tickers, columns=tickers)
+
+    instrumentation.count('analytics_cells', values.size)
+    returns = log_returns(values, signs)
+
+    # Último retorno válido de cada ativo e o desvio da janela anterior a ele
+    rows = np.arange(len(returns))[:, None]
+    last = np.where(~np.isnan(returns), rows, -1).max(axis=0)
+    columns = np.arange(len(tickers))
+    latest = np.where(last >= 0, returns[np.maximum(last, 0), columns], np.nan)
+    std = rolling_std(returns, window)
+    previous_std = np.where(last >= 1, std[np.maximum(last - 1, 0), columns], np.nan)
+    current_std = np.where(last >= 0, std[np.maximum(last, 0), columns], np.nan)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        zscore = latest / previous_std
+
+    table = pd.DataFrame({
+        'Moeda': tickers,
+        'Volatilidade (%)': current_std * np.sqrt(PERIODS_PER_YEAR) * 100,
+        'Máx. Drawdown (%)': max_drawdown(returns) * 100,
+        'Último Retorno (%)': np.expm1(latest) * 100,
+        'Z-score': zscore,
+    })
+    table = table.dropna(subset=['Volatilidade (%)']).reset_index(drop=True)
+
+    corr = pd.DataFrame(correlation_matrix(returns, min_periods), index=tickers, columns=tickers)
+    return table, corr
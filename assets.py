@@ -0,0 +1,158 @@
+from dataclasses import dataclass
+
+# Define as moedas e seus tickers no Yahoo Finance com nomes completos
+currencies = {
+    'TRY/USD': {'ticker': 'USDTRY=X', 'name': 'Lira Turca', 'invert': False, 'country_code': 'TR'},
+    'BRL/USD': {'ticker': 'USDBRL=X', 'name': 'Real', 'invert': False, 'country_code': 'BR'},
+    'ARS/USD': {'ticker': 'USDARS=X', 'name': 'Peso Argentino', 'invert': False, 'country_code': 'AR'},
+    'MXN/USD': {'ticker': 'USDMXN=X', 'name': 'Peso Mexicano', 'invert': False, 'country_code': 'MX'},
+    'CAD/USD': {'ticker': 'USDCAD=X', 'name': 'Dólar Canadense', 'invert': False, 'country_code': 'CA'},
+    'EUR/USD': {'ticker': 'EURUSD=X', 'name': 'Euro', 'invert': True, 'country_code': 'EU'},
+    #'ZAR/USD': {'ticker': 'USDZAR=X', 'name': 'Rand Sul-Africano', 'invert': False, 'country_code': 'ZA'},
+    'JPY/USD': {'ticker': 'JPY=X', 'name': 'Iene Japonês', 'invert': False, 'country_code': 'JP'},
+    'CNY/USD': {'ticker': 'USDCNY=X', 'name': 'Yuan Chinês', 'invert': False, 'country_code': 'CN'},
+    'KRW/USD': {'ticker': 'USDKRW=X', 'name': 'Won Sul-Coreano', 'invert': False, 'country_code': 'KR'},
+    'INR/USD': {'ticker': 'USDINR=X', 'name': 'Rúpia Indiana', 'invert': False, 'country_code': 'IN'},
+    'SGD/USD': {'ticker': 'USDSGD=X', 'name': 'Dólar de Singapura', 'invert': False, 'country_code': 'SG'},
+    'NZD/USD': {'ticker': 'NZDUSD=X', 'name': 'Dólar Neozelandês', 'invert': True, 'country_code': 'NZ'},
+    'AUD/USD': {'ticker': 'AUDUSD=X', 'name': 'Dólar Australiano', 'invert': True, 'country_code': 'AU'},
+    'RUB/USD': {'ticker': 'USDRUB=X', 'name': 'Rublo Russo', 'invert': False, 'country_code': 'RU'},
+    'GBP/USD': {'ticker': 'GBPUSD=X', 'name': 'Libra Esterlina', 'invert': True, 'country_code': 'GB'},
+    'HUF/USD': {'ticker': 'USDHUF=X', 'name': 'Florim Húngaro', 'invert': False, 'country_code': 'HU'},
+}
+
+# Adiciona o DXY (Índice do Dólar)
+currencies['DXY'] = {'ticker': 'DX-Y.NYB', 'name': 'DXY', 'invert': False}
+
+# Define as commodities e seus tickers
+commodities = {
+    'CL': {'ticker': 'CL=F', 'name': 'Petróleo WTI', 'invert': False},
+    'BZ': {'ticker': 'BZ=F', 'name': 'Petróleo Brent', 'invert': False},
+    'GC': {'ticker': 'GC=F', 'name': 'Ouro', 'invert': False},
+    'SI': {'ticker': 'SI=F', 'name': 'Prata', 'invert': False},
+    'HG': {'ticker': 'HG=F', 'name': 'Cobre', 'invert': False},
+    'PL': {'ticker': 'PL=F', 'name': 'Platina', 'invert': False},
+    'PA': {'ticker': 'PA=F', 'name': 'Paládio', 'invert': False},
+    'NG': {'ticker': 'NG=F', 'name': 'Gás Natural', 'invert': False},
+    'ZC': {'ticker': 'ZC=F', 'name': 'Milho', 'invert': False},
+    'ZS': {'ticker': 'ZS=F', 'name': 'Soja', 'invert': False},
+    'ZW': {'ticker': 'ZW=F', 'name': 'Trigo', 'invert': False},
+}
+
+# Ticker e rótulo do Índice do Dólar, que aparece como 'DXY' nas tabelas de saída
+DXY_TICKER = 'DX-Y.NYB'
+DXY_LABEL = 'DXY'
+DXY_DISPLAY_NAME = 'Índice do Dólar (DXY)'
+
+
+@dataclass(frozen=True)
+class Asset:
+    symbol: str
+    ticker: str
+    name: str
+    display_name: str
+    label: str
+    asset_class: str
+    invert: bool
+    sign: float
+    country_code: str = None
+
+
+class AssetRegistry:
+    # Registro imutável dos ativos, construído uma vez e compartilhado por busca,
+    # cálculo e relatório. Buscas por ticker, símbolo, rótulo de saída e código de
+    # país são O(1); tickers e nomes por classe ficam pré-calculados, e os vetores
+    # de sinais são montados no primeiro uso (só então o numpy é importado)
+
+    def __init__(self, assets):
+        self.assets = tuple(assets)
+        self._by_ticker = {asset.ticker: asset for asset in self.assets}
+        self._by_symbol = {asset.symbol: asset for asset in self.assets}
+        self._by_label = {asset.label: asset for asset in self.assets}
+        self._by_label.update(self._by_ticker)
+        self._by_country = {asset.country_code: asset for asset in self.assets if asset.country_code}
+
+        self._tickers = {None: tuple(asset.ticker for asset in self.assets)}
+        for asset_class in {asset.asset_class for asset in self.assets}:
+            self._tickers[asset_class] = tuple(asset.ticker for asset in self.assets
+                                               if asset.asset_class == asset_class)
+        self._signs = {}
+
+    @classmethod
+    def from_dicts(cls, currencies, commodities):
+        assets = []
+        for symbol, info in currencies.items():
+            is_dxy = info['ticker'] == DXY_TICKER
+            # Cotações USD/XXX são invertidas; DXY e pares XXX/USD mantêm o sinal
+            sign = 1.0 if is_dxy or info['invert'] else -1.0
+            assets.append(Asset(
+                symbol=symbol,
+                ticker=info['ticker'],
+                name=info['name'],
+                display_name=DXY_DISPLAY_NAME if is_dxy else info['name'],
+                label=DXY_LABEL if is_dxy else info['ticker'],
+                asset_class='currency',
+                invert=info['invert'],
+                sign=sign,
+                country_code=info.get('country_code'),
+            ))
+        for symbol, info in commodities.items():
+            assets.append(Asset(
+                symbol=symbol,
+                ticker=info['ticker'],
+                name=info['name'],
+                display_name=info['name'],
+                label=info['ticker'],
+                asset_class='commodity',
+                invert=info['invert'],
+                sign=1.0,
+            ))
+        return cls(assets)
+
+    def __len__(self):
+        return len(self.assets)
+
+    def __iter__(self):
+        return iter(self.assets)
+
+    def __contains__(self, key):
+        return key in self._by_label or key in self._by_symbol
+
+    def by_ticker(self, ticker):
+        return self._by_ticker[ticker]
+
+    def by_symbol(self, symbol):
+        return self._by_symbol[symbol]
+
+    def by_country(self, country_code):
+        return self._by_country[country_code]
+
+    def lookup(self, label):
+        # Aceita tanto o ticker quanto o rótulo usado na coluna 'Moeda' das tabelas
+        try:
+            return self._by_label[label]
+        except KeyError:
+            raise KeyError(f"Ativo desconhecido no registro: {label!r}") from None
+
+    def tickers(self, asset_class=None):
+        return self._tickers[asset_class]
+
+    def signs(self, asset_class=None):
+        # Vetor somente leitura, compartilhado entre as chamadas
+        if asset_class not in self._signs:
+            import numpy as np
+
+            signs = np.array([self._by_ticker[ticker].sign for ticker in self._tickers[asset_class]])
+            signs.flags.writeable = False
+            self._signs[asset_class] = signs
+        return self._signs[asset_class]
+
+    def display_names(self, labels):
+        return [self.lookup(label).display_name for label in labels]
+
+    def labels(self, tickers):
+        return [self._by_ticker[ticker].label for ticker in tickers]
+
+
+# Registro único usado por todo o projeto
+REGISTRY = AssetRegistry.from_dicts(currencies, commodities)
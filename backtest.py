@@ -0,0 +1,173 @@
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import instrumentation
+from assets import REGISTRY
+from currency_data import (add_base_argument, add_data_arguments, add_output_arguments, add_panel_arguments,
+                           data_options, load_compact_panel, load_price_panel, output_formats,
+                           panel_for_base, panel_options, parse_bases, parse_horizons, save_outputs,
+                           split_performance_tables)
+
+# Frequência padrão das datas de referência: toda sexta-feira
+DEFAULT_FREQ = 'W-FRI'
+
+# Diretório padrão dos relatórios históricos
+DEFAULT_OUTPUT_DIR = 'reports'
+
+# Registro compartilhado pelos processos de renderização, recebido uma vez na inicialização
+_worker_registry = None
+
+
+def as_of_dates(dates=None, start=None, end=None, freq=DEFAULT_FREQ):
+    # Datas de referência a partir de uma lista ('2024-01-05,2024-01-12') ou de
+    # um intervalo com frequência do pandas ('W-FRI', 'ME', 'B'...)
+    import pandas as pd
+
+    if dates:
+        result = [pd.Timestamp(d.strip()) for d in dates.split(',') if d.strip()]
+    elif start:
+        result = list(pd.date_range(start, end or pd.Timestamp.today().normalize(), freq=freq))
+    else:
+        raise ValueError("Informe --dates ou --start")
+    return sorted(set(result))
+
+
+def snapshot_suffix(as_of, base='USD'):
+    # '_2024-01-05', ou '_2024-01-05_EUR' fora do dólar
+    return f'_{as_of:%Y-%m-%d}' + ('' if base == 'USD' else f'_{base}')
+
+
+def report_name(as_of, base='USD'):
+    return f'market_report{snapshot_suffix(as_of, base)}.pdf'
+
+
+def _init_worker(registry):
+    # Cada processo carrega matplotlib, fontes e estilos uma única vez e guarda o
+    # registro, que não precisa ser serializado a cada relatório
+    global _worker_registry
+
+    import matplotlib
+    matplotlib.use('Agg')
+    import report_generator  # noqa: F401
+    import report_layout  # noqa: F401
+
+    _worker_registry = registry
+
+
+def _render_report(df_currencies, df_commodities, output_path, fmt, dpi, rows_per_page):
+    # Executa no processo filho: gráficos e PDF de uma data de referência
+    import report_generator
+
+    registry = _worker_registry or REGISTRY
+    with instrumentation.span('backtest.report'):
+        currency_chart = report_generator.create_enhanced_chart(df_currencies, fmt, dpi, registry)
+        commodity_chart = report_generator.create_enhanced_commodities_chart(df_commodities, fmt, dpi, registry)
+        report_generator.create_combined_pdf(currency_chart, commodity_chart, df_currencies, df_commodities,
+                                             output_path=output_path, registry=registry,
+                                             rows_per_page=rows_per_page, chart_format=fmt, chart_dpi=dpi)
+    return output_path
+
+
+def compute_backtest(panel, dates, horizons=(), registry=REGISTRY):
+    # Tabelas (moedas, commodities) de cada data de referência, todas calculadas
+    # sobre o mesmo painel em uma passada
+    from performance import compute_snapshots
+
+    tickers = list(registry.tickers())
+    snapshots = compute_snapshots(panel.reindex(columns=tickers), registry.signs(), dates, horizons)
+    return {as_of: split_performance_tables(results, registry) for as_of, results in snapshots.items()}
+
+
+def run_backtest(dates, horizons=(), output_dir=DEFAULT_OUTPUT_DIR, bases=('USD',), save_formats=None,
+                 chart_format=None, chart_dpi=None, render_workers=None, rows_per_page=None,
+                 render=True, compact=None, **data_kwargs):
+    # Gera os relatórios de várias datas de referência: baixa o painel uma vez,
+    # do início do horizonte mais longo da data mais antiga até a mais recente,
+    # calcula todas as datas de uma vez e renderiza os PDFs em paralelo, em até
+    # `render_workers` processos. Devolve {(data, base): caminho do PDF}, ou as
+    # tabelas (moedas, commodities) no lugar do caminho quando `render` é False.
+    # Com `compact` (opções de load_compact_panel) o painel fica em uma matriz
+    # compacta, que pode ir para o disco em históricos longos
+    from performance import history_start
+
+    dates = sorted(dates)
+    start = history_start(horizons, dates[0].to_pydatetime())
+    end = dates[-1].strftime('%Y-%m-%d')
+    with instrumentation.span('fetch'):
+        if compact is None:
+            panel = load_price_panel(list(REGISTRY.tickers()), start, end, **data_kwargs)
+        else:
+            panel = load_compact_panel(list(REGISTRY.tickers()), start, end, **compact, **data_kwargs)
+
+    os.makedirs(output_dir, exist_ok=True)
+    results = {}
+    for base in bases:
+        base_panel, registry = panel_for_base(panel, base)
+        with instrumentation.span('compute', base=base, dates=len(dates)):
+            tables = compute_backtest(base_panel, dates, horizons, registry)
+
+        if save_formats:
+            for as_of, (df_currencies, df_commodities) in tables.items():
+                save_outputs(df_currencies, df_commodities, snapshot_suffix(as_of, base), save_formats,
+                             registry, output_dir)
+
+        if not render:
+            results.update({(as_of, base): table for as_of, table in tables.items()})
+            continue
+
+        jobs = [(df_currencies, df_commodities, os.path.join(output_dir, report_name(as_of, base)),
+                 chart_format, chart_dpi, rows_per_page)
+                for as_of, (df_currencies, df_commodities) in tables.items()]
+        workers = min(render_workers or os.cpu_count() or 1, len(jobs))
+        with instrumentation.span('render', base=base, reports=len(jobs)):
+            if workers <= 1:
+                _init_worker(registry)
+                paths = [_render_report(*job) for job in jobs]
+            else:
+                with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                         initargs=(registry,)) as pool:
+                    paths = list(pool.map(_render_report, *zip(*jobs)))
+        results.update({(as_of, base): path for as_of, path in zip(tables, paths)})
+
+    if compact is not None:
+        panel.close()
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Gera relatórios históricos para várias datas de referência')
+    add_data_arguments(parser)
+    add_base_argument(parser)
+    parser.add_argument('--dates', help="datas de referência separadas por vírgula, ex.: '2024-01-05,2024-01-12'")
+    parser.add_argument('--start', help='primeira data do intervalo de datas de referência')
+    parser.add_argument('--end', help='última data do intervalo (padrão: hoje)')
+    parser.add_argument('--freq', default=DEFAULT_FREQ, help='frequência do intervalo (padrão: W-FRI, toda sexta)')
+    parser.add_argument('--output-dir', default=DEFAULT_OUTPUT_DIR, help='diretório dos PDFs gerados')
+    parser.add_argument('--chart-format', choices=['vector', 'png'])
+    parser.add_argument('--dpi', type=int)
+    parser.add_argument('--render-workers', type=int,
+                        help='processos usados para renderizar os relatórios (padrão: núcleos disponíveis)')
+    parser.add_argument('--rows-per-page', type=int)
+    parser.add_argument('--save', action='store_true', help='grava também as tabelas de cada data')
+    add_output_arguments(parser)
+    add_panel_arguments(parser)
+    parser.add_argument('--trace', metavar='ARQUIVO', help='grava tempos por etapa e contadores')
+    args = parser.parse_args(argv)
+
+    dates = as_of_dates(args.dates, args.start, args.end, args.freq)
+    with instrumentation.span('backtest', dates=len(dates)):
+        results = run_backtest(dates, parse_horizons(args.horizons), args.output_dir,
+                               parse_bases(args.base),
+                               output_formats(args) if args.save or args.csv else None,
+                               args.chart_format, args.dpi,
+                               args.render_workers, args.rows_per_page, compact=panel_options(args),
+                               **data_options(args))
+
+    if args.trace:
+        instrumentation.write_trace(args.trace)
+    print(f"✅ {len(results)} relatórios gerados em {args.output_dir}")
+
+
+if __name__ == "__main__":
+    main()
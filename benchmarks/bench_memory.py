@@ -0,0 +1,63 @@
+import argparse
+import os
+import sys
+import tracemalloc
+from datetime import datetime
+
+# Raiz do projeto, para importar os módulos a partir de qualquer diretório
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Painel medido: ~10 anos de pregões x universo grande, em float32
+ROWS = 4000
+TICKERS = 2500
+MEMORY_BUDGET = 8 * 2 ** 20
+
+
+def synthetic_compact(rows, tickers, budget):
+    # Painel compacto preenchido em blocos de linhas, sem nenhuma matriz inteira na RAM
+    import numpy as np
+    import pandas as pd
+
+    from compact_panel import CompactPanel
+
+    dates = pd.bdate_range(end=datetime.now().date(), periods=rows)
+    names = [f'T{i:05d}' for i in range(tickers)]
+    compact = CompactPanel.empty(names, dates.values, np.float32, budget)
+    rng = np.random.default_rng(0)
+    step = max(1, budget // 4 // (tickers * 8))
+    for start in range(0, rows, step):
+        block = rng.normal(0, 0.01, size=(min(step, rows - start), tickers))
+        compact.values[start:start + step] = 100 * np.exp(block)
+    return compact
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Verifica que o cálculo respeita o orçamento de memória do painel')
+    parser.add_argument('--rows', type=int, default=ROWS)
+    parser.add_argument('--tickers', type=int, default=TICKERS)
+    parser.add_argument('--budget-mb', type=float, default=MEMORY_BUDGET / 2 ** 20)
+    args = parser.parse_args(argv)
+
+    import numpy as np
+
+    from performance import compute_performance
+
+    budget = int(args.budget_mb * 2 ** 20)
+    compact = synthetic_compact(args.rows, args.tickers, budget)
+    signs = np.ones(args.tickers)
+
+    tracemalloc.start()
+    table = compute_performance(compact, signs, datetime.now(), ['1M', '3M', '1Y'])
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    compact.close()
+
+    status = 'ok' if peak <= budget else 'FALHOU'
+    print(f"{status:7} compute_performance {args.rows}x{args.tickers} float32 "
+          f"({len(table)} linhas): pico {peak / 2 ** 20:.1f} MiB (orçamento {budget / 2 ** 20:.1f} MiB)")
+    return 0 if peak <= budget else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,71 @@
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# Raiz do projeto, para rodar os comandos a partir de qualquer diretório
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Módulos que não podem ser carregados só por importar o projeto ou pedir --help
+HEAVY_MODULES = ['numpy', 'pandas', 'matplotlib', 'reportlab', 'yfinance', 'svglib']
+
+# Comandos medidos e o orçamento de tempo de cada um, em segundos
+CASES = {
+    'import report_generator': ([sys.executable, '-c', 'import report_generator'], 0.5),
+    'import pipeline': ([sys.executable, '-c', 'import pipeline'], 0.5),
+    'pipeline --help': ([sys.executable, 'pipeline.py', '--help'], 0.6),
+}
+
+
+def time_command(command, repeat):
+    # Mediana do tempo de parede de `repeat` execuções em processos novos
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(command, cwd=ROOT, check=True, stdout=subprocess.DEVNULL)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def heavy_modules_loaded(module):
+    # Lista os módulos pesados presentes em sys.modules depois de importar `module`
+    code = (f'import sys, {module}; '
+            f'print(",".join(m for m in {HEAVY_MODULES!r} if m in sys.modules))')
+    output = subprocess.run([sys.executable, '-c', code], cwd=ROOT, check=True,
+                            capture_output=True, text=True).stdout.strip()
+    return [m for m in output.split(',') if m]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Mede o tempo de inicialização e aplica o orçamento')
+    parser.add_argument('--repeat', type=int, default=5, help='execuções por comando')
+    parser.add_argument('--scale', type=float, default=1.0,
+                        help='multiplica os orçamentos (para máquinas mais lentas)')
+    args = parser.parse_args(argv)
+
+    failures = []
+    for module in ('report_generator', 'pipeline', 'currency_data'):
+        loaded = heavy_modules_loaded(module)
+        status = 'ok' if not loaded else 'FALHOU'
+        print(f"{status:7} import {module}: módulos pesados carregados: {loaded or 'nenhum'}")
+        if loaded:
+            failures.append(f'import {module}')
+
+    for name, (command, budget) in CASES.items():
+        budget *= args.scale
+        elapsed = time_command(command, args.repeat)
+        status = 'ok' if elapsed <= budget else 'FALHOU'
+        print(f"{status:7} {name}: {elapsed * 1000:.0f} ms (orçamento {budget * 1000:.0f} ms)")
+        if elapsed > budget:
+            failures.append(name)
+
+    if failures:
+        print(f"\nFora do orçamento: {', '.join(failures)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
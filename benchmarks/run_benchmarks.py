@@ -0,0 +1,228 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# Permite rodar o script direto de benchmarks/ importando os módulos do projeto
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from assets import Asset, AssetRegistry  # noqa: E402
+
+# Horizontes calculados em todos os cenários, além de YTD e semanal
+HORIZONS = ['1D', 'MTD', 'QTD', '1M', '3M', '6M', '1Y']
+
+DEFAULT_BASELINE = os.path.join(ROOT, 'benchmarks', 'baseline.json')
+
+# Diferenças abaixo disto (em segundos) são ruído de medição, nunca regressão
+NOISE_FLOOR = 0.005
+
+
+def synthetic_registry(tickers):
+    # Registro com metade dos tickers como moedas (sinais alternados) e metade como commodities
+    half = len(tickers) // 2
+    assets = []
+    for i, ticker in enumerate(tickers):
+        is_currency = i < half
+        invert = i % 2 == 0
+        assets.append(Asset(
+            symbol=ticker,
+            ticker=ticker,
+            name=ticker,
+            display_name=ticker,
+            label=ticker,
+            asset_class='currency' if is_currency else 'commodity',
+            invert=invert,
+            sign=-1.0 if is_currency and not invert else 1.0,
+        ))
+    return AssetRegistry(assets)
+
+
+def measure(func, repeat):
+    # Melhor tempo entre `repeat` execuções e pico de memória de uma execução extra
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, min(timings), peak
+
+
+def run_scenario(n_tickers, years, repeat, render, fmt, dpi, workdir, analytics=True):
+    import numpy as np
+    import pandas as pd
+
+    from compact_panel import CompactPanel
+    from currency_data import build_performance_tables
+    from performance import history_start, horizon_positions, prepare_panel
+    from price_sources import synthetic_panel
+
+    panel = synthetic_panel(n_tickers, years * 252)
+    registry = synthetic_registry(list(panel.columns))
+    current_date = (panel.index[-1] + pd.Timedelta(days=1)).to_pydatetime()
+    results = {}
+
+    # Recorte das janelas com o código do cálculo: a janela do painel compacto
+    # até a data de referência e as posições de base e fim de cada horizonte,
+    # sobre as posições válidas pré-calculadas (fora da medição)
+    compact = CompactPanel.from_frame(panel)
+    today = pd.Timestamp(current_date.date())
+    arrays = prepare_panel(compact.window(end=today))
+    columns = np.arange(len(arrays['tickers']))
+    end_pos = arrays['prev_valid'][-1]
+
+    def slice_windows():
+        compact.window(end=today)
+        return [horizon_positions(horizon, arrays['dates'], arrays['prev_valid'], end_pos, columns)
+                for horizon in HORIZONS]
+
+    _, seconds, peak = measure(slice_windows, repeat)
+    results['slice'] = {'seconds': seconds, 'peak_bytes': peak}
+    del arrays
+    window = panel[(panel.index >= pd.Timestamp(history_start(HORIZONS, current_date))) & (panel.index < today)]
+
+    # Cálculo vetorizado de todos os horizontes
+    def compute():
+        return build_performance_tables(window, current_date, HORIZONS, registry)
+
+    (df_currencies, df_commodities), seconds, peak = measure(compute, repeat)
+    results['compute'] = {'seconds': seconds, 'peak_bytes': peak}
+
+    # Volatilidade, drawdown e matriz de correlação completa sobre todo o histórico
+    def compute_analytics():
+        from analytics import compute_analytics
+
+        return compute_analytics(panel, registry.signs(), current_date)
+
+    if analytics:
+        _, seconds, peak = measure(compute_analytics, repeat)
+        results['analytics'] = {'seconds': seconds, 'peak_bytes': peak}
+
+    if not render:
+        return results
+
+    import report_generator
+
+    renamed = {'Performance YTD (%)': 'YTD', 'Performance Semanal (%)': 'Δ Semana'}
+
+    # Montagem das linhas das tabelas
+    def build_tables():
+        return (report_generator.performance_table_data(df_currencies.rename(columns=renamed), 'Moeda', registry),
+                report_generator.performance_table_data(df_commodities.rename(columns=renamed), 'Commodity', registry))
+
+    _, seconds, peak = measure(build_tables, repeat)
+    results['table'] = {'seconds': seconds, 'peak_bytes': peak}
+
+    # Renderização dos dois gráficos
+    def render_charts():
+        return (report_generator.create_enhanced_chart(df_currencies, fmt, dpi, registry),
+                report_generator.create_enhanced_commodities_chart(df_commodities, fmt, dpi, registry))
+
+    (currency_chart, commodity_chart), seconds, peak = measure(render_charts, repeat)
+    results['chart'] = {'seconds': seconds, 'peak_bytes': peak,
+                        'output_bytes': len(currency_chart.getvalue()) + len(commodity_chart.getvalue())}
+
+    # Montagem do PDF com os gráficos já prontos
+    output_path = os.path.join(workdir, f'bench_{n_tickers}_{years}.pdf')
+
+    def build_pdf():
+        currency_chart.seek(0)
+        commodity_chart.seek(0)
+        report_generator.create_combined_pdf(currency_chart, commodity_chart, df_currencies,
+                                             df_commodities, output_path=output_path, registry=registry)
+
+    _, seconds, peak = measure(build_pdf, repeat)
+    results['pdf'] = {'seconds': seconds, 'peak_bytes': peak,
+                      'output_bytes': os.path.getsize(output_path)}
+    return results
+
+
+def compare(results, baseline, tolerance, floor=NOISE_FLOOR):
+    # Lista as etapas mais lentas que a linha de base além da tolerância relativa
+    # e de `floor` segundos em valor absoluto
+    regressions = []
+    for scenario, stages in results.items():
+        for stage, metrics in stages.items():
+            reference = baseline.get(scenario, {}).get(stage)
+            if not reference or metrics['seconds'] - reference['seconds'] < floor:
+                continue
+            ratio = metrics['seconds'] / reference['seconds'] if reference['seconds'] else 1.0
+            if ratio > 1 + tolerance:
+                regressions.append((scenario, stage, ratio))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmarks das etapas do relatório com painéis sintéticos')
+    parser.add_argument('--tickers', default='28,1000,10000', help='tamanhos de universo, separados por vírgula')
+    parser.add_argument('--years', default='1,5,20', help='anos de histórico, separados por vírgula')
+    parser.add_argument('--repeat', type=int, default=3, help='execuções por etapa (vale o melhor tempo)')
+    parser.add_argument('--no-render', action='store_true', help='mede só recorte, cálculo e análises')
+    parser.add_argument('--max-render-tickers', type=int, default=100,
+                        help='não renderiza gráficos e PDF acima deste número de tickers')
+    parser.add_argument('--max-analytics-tickers', type=int, default=1000,
+                        help='não mede as análises acima deste número de tickers (a matriz de '
+                             'correlação cresce com o quadrado do universo)')
+    parser.add_argument('--chart-format', default='png', choices=['vector', 'png'])
+    parser.add_argument('--dpi', type=int, default=300)
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='arquivo JSON da linha de base')
+    parser.add_argument('--save-baseline', action='store_true', help='grava os resultados como nova linha de base')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='lentidão relativa aceita antes de acusar regressão (0.2 = 20%%)')
+    parser.add_argument('--noise-floor', type=float, default=NOISE_FLOOR,
+                        help='diferença mínima, em segundos, para acusar regressão')
+    parser.add_argument('--output', help='grava os resultados em JSON neste arquivo')
+    args = parser.parse_args(argv)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for n_tickers in [int(n) for n in args.tickers.split(',')]:
+            for years in [int(y) for y in args.years.split(',')]:
+                scenario = f'{n_tickers}x{years}y'
+                render = not args.no_render and n_tickers <= args.max_render_tickers
+                stages = run_scenario(n_tickers, years, args.repeat, render,
+                                      args.chart_format, args.dpi, workdir,
+                                      n_tickers <= args.max_analytics_tickers)
+                results[scenario] = stages
+                for stage, metrics in stages.items():
+                    size = f", saída {metrics['output_bytes'] / 1024:.0f} KiB" if 'output_bytes' in metrics else ''
+                    print(f"{scenario:>12} {stage:9} {metrics['seconds'] * 1000:9.1f} ms, "
+                          f"pico {metrics['peak_bytes'] / 2 ** 20:8.1f} MiB{size}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    # A linha de base guarda o número de execuções: o melhor de 1 e o melhor de 3
+    # não são comparáveis
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump({'repeat': args.repeat, 'scenarios': results}, f, indent=2)
+        print(f"Linha de base gravada em {args.baseline}")
+        return 0
+
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get('repeat') != args.repeat:
+            print(f"Linha de base medida com --repeat {baseline.get('repeat')}; "
+                  f"rode com o mesmo valor para comparar")
+            return 2
+        regressions = compare(results, baseline['scenarios'], args.tolerance, args.noise_floor)
+        for scenario, stage, ratio in regressions:
+            print(f"REGRESSÃO {scenario} {stage}: {ratio:.2f}x a linha de base")
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,205 @@
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+import instrumentation
+
+# Tipos aceitos para os fechamentos: float32 ocupa metade da memória, com
+# precisão (~7 dígitos) suficiente para retornos em %
+DTYPES = {'float32': np.float32, 'float64': np.float64}
+
+# Tickers lidos do cache por consulta ao montar o painel compacto
+CHUNK_SIZE = 500
+
+# Tamanho dos blocos de colunas processados de uma vez quando não há orçamento
+DEFAULT_BLOCK_BYTES = 64 * 2 ** 20
+
+
+def parse_memory_budget(text):
+    # '512M', '2G', '1048576' -> bytes; None ou '' -> sem limite
+    if not text:
+        return None
+    text = str(text).strip().upper()
+    units = {'K': 2 ** 10, 'M': 2 ** 20, 'G': 2 ** 30}
+    if text[-1] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+    return int(text)
+
+
+def block_columns(rows, itemsize, memory_budget=None):
+    # Colunas por bloco para que um temporário (rows x bloco) de `itemsize` bytes
+    # use no máximo um quarto do orçamento
+    limit = DEFAULT_BLOCK_BYTES if memory_budget is None else memory_budget // 4
+    return max(1, limit // max(1, rows * itemsize))
+
+
+def allocate(shape, dtype=np.float64, memory_budget=None, spill_dir=None, fill=np.nan):
+    # Matriz contígua preenchida com `fill` (None: sem preencher, para quem vai
+    # sobrescrever tudo). Acima de `memory_budget` bytes (0: sempre) ela é criada em um arquivo
+    # temporário mapeado em memória (np.memmap), e o sistema operacional decide
+    # quais páginas ficam na RAM. Devolve (matriz, caminho ou None)
+    nbytes = int(np.prod(shape)) * np.dtype(dtype).itemsize
+    if memory_budget is None or nbytes <= memory_budget:
+        if fill is None:
+            return np.empty(shape, dtype=dtype), None
+        return np.full(shape, fill, dtype=dtype), None
+
+    instrumentation.count('panel_spills')
+    instrumentation.count('panel_spilled_bytes', nbytes)
+    fd, path = tempfile.mkstemp(dir=spill_dir, prefix='panel-', suffix='.bin')
+    os.close(fd)
+    values = np.memmap(path, dtype=dtype, mode='w+', shape=shape)
+    if fill is not None:
+        # Preenche em blocos de linhas para não materializar a matriz inteira de uma vez
+        step = max(1, memory_budget // max(1, shape[1] * np.dtype(dtype).itemsize))
+        for start in range(0, shape[0], step):
+            values[start:start + step] = fill
+    try:
+        # Em POSIX o arquivo some do diretório e o espaço é liberado quando o mapa for fechado
+        os.unlink(path)
+        path = None
+    except OSError:
+        pass
+    return values, path
+
+
+class CompactPanel:
+    # Painel de fechamentos (data x ticker) em uma única matriz contígua float32
+    # ou float64, com eixo de tickers codificado em inteiros e índice de datas
+    # compartilhado (datetime64 ordenado). Pode viver em um np.memmap quando
+    # passa do orçamento de memória. Oferece o pedaço da interface de DataFrame
+    # usado pelo cálculo: index, columns, reindex e to_numpy. O orçamento vale
+    # também para as matrizes derivadas do cálculo (performance.prepare_panel)
+
+    def __init__(self, values, dates, tickers, spill_path=None, memory_budget=None, spill_dir=None):
+        self.values = values
+        self.dates = np.asarray(dates, dtype='datetime64[ns]')
+        self.tickers = tuple(tickers)
+        self.codes = {ticker: code for code, ticker in enumerate(self.tickers)}
+        self.spill_path = spill_path
+        self.memory_budget = memory_budget
+        self.spill_dir = spill_dir
+
+    @classmethod
+    def empty(cls, tickers, dates, dtype=np.float64, memory_budget=None, spill_dir=None):
+        dates = np.unique(np.asarray(dates, dtype='datetime64[ns]'))
+        values, path = allocate((len(dates), len(tickers)), dtype, memory_budget, spill_dir)
+        return cls(values, dates, tickers, path, memory_budget, spill_dir)
+
+    @classmethod
+    def from_frame(cls, panel, dtype=np.float64, memory_budget=None, spill_dir=None):
+        panel = panel.sort_index()
+        compact = cls.empty(list(panel.columns), panel.index.values, dtype, memory_budget, spill_dir)
+        compact.set_columns(panel)
+        return compact
+
+    @property
+    def index(self):
+        return pd.DatetimeIndex(self.dates)
+
+    @property
+    def columns(self):
+        return pd.Index(self.tickers)
+
+    @property
+    def nbytes(self):
+        return self.values.nbytes
+
+    @property
+    def spilled(self):
+        return isinstance(self.values, np.memmap)
+
+    def __len__(self):
+        return len(self.dates)
+
+    def encode(self, tickers):
+        # Códigos inteiros dos tickers (-1 para os ausentes)
+        return np.array([self.codes.get(t, -1) for t in tickers], dtype=np.int64)
+
+    def set_columns(self, panel):
+        # Copia as colunas de um DataFrame (data x ticker) para a matriz, alinhando
+        # as datas por busca binária; datas fora do índice compartilhado são ignoradas
+        panel = panel.sort_index()
+        rows = np.searchsorted(self.dates, panel.index.values)
+        inside = rows < len(self.dates)
+        inside[inside] = self.dates[rows[inside]] == panel.index.values[inside]
+        for ticker in panel.columns:
+            code = self.codes.get(ticker)
+            if code is not None:
+                self.values[rows[inside], code] = panel[ticker].to_numpy()[inside]
+
+    def set_rows(self, tickers, dates, closes):
+        # Grava fechamentos em formato longo (ticker, data, preço), como saem do SQLite
+        rows = np.searchsorted(self.dates, np.asarray(dates, dtype='datetime64[ns]'))
+        self.values[rows, self.encode(tickers)] = closes
+
+    def window(self, start=None, end=None):
+        # Linhas na janela [start, end), sem copiar a matriz
+        lo = 0 if start is None else np.searchsorted(self.dates, np.datetime64(pd.Timestamp(start)))
+        hi = len(self.dates) if end is None else np.searchsorted(self.dates, np.datetime64(pd.Timestamp(end)))
+        return CompactPanel(self.values[lo:hi], self.dates[lo:hi], self.tickers,
+                            memory_budget=self.memory_budget, spill_dir=self.spill_dir)
+
+    def reindex(self, columns):
+        # Mesmo painel com as colunas na ordem pedida; sem cópia se já estiverem nela
+        columns = list(columns)
+        if tuple(columns) == self.tickers:
+            return self
+        codes = self.encode(columns)
+        values, path = allocate((len(self.dates), len(columns)), self.values.dtype, self.memory_budget,
+                                self.spill_dir)
+        # Copia em blocos de colunas para não criar um temporário do tamanho da matriz
+        step = block_columns(len(self.dates), self.values.dtype.itemsize, self.memory_budget)
+        for start in range(0, len(columns), step):
+            block = codes[start:start + step]
+            present = np.flatnonzero(block >= 0)
+            values[:, start + present] = self.values[:, block[present]]
+        return CompactPanel(values, self.dates, columns, path, self.memory_budget, self.spill_dir)
+
+    def to_numpy(self, dtype=None):
+        return np.asarray(self.values, dtype=dtype)
+
+    def to_frame(self):
+        # DataFrame sobre a mesma matriz (sem cópia quando possível)
+        return pd.DataFrame(self.values, index=self.index, columns=list(self.tickers), copy=False)
+
+    def close(self):
+        # Libera o mapa em memória e o arquivo temporário, se houver
+        if self.spilled:
+            self.values._mmap.close()
+        if self.spill_path:
+            try:
+                os.unlink(self.spill_path)
+            except OSError:
+                pass
+        self.values = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def load_compact(cache, tickers, start=None, end=None, dtype=np.float64, memory_budget=None,
+                 spill_dir=None, chunk_size=CHUNK_SIZE):
+    # Monta o painel compacto direto do cache SQLite, em blocos de tickers: a
+    # primeira passada coleta as datas, a segunda grava os fechamentos na matriz.
+    # Nenhum DataFrame largo é criado, então o pico de memória fica no tamanho da
+    # matriz (ou no orçamento, se ela for para o disco) mais um bloco
+    tickers = list(tickers)
+    chunks = [tickers[i:i + chunk_size] for i in range(0, len(tickers), chunk_size)]
+
+    dates = set()
+    for chunk in chunks:
+        dates.update(cache.dates(chunk, start, end))
+    compact = CompactPanel.empty(tickers, sorted(dates), dtype, memory_budget, spill_dir)
+
+    for chunk in chunks:
+        rows = cache.rows(chunk, start, end)
+        compact.set_rows(rows['ticker'].to_numpy(), pd.to_datetime(rows['date']).values,
+                         rows['close'].to_numpy(dtype=np.float64))
+    instrumentation.count('compact_panel_bytes', compact.nbytes)
+    return compact
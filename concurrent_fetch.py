@@ -0,0 +1,210 @@
+import queue
+import threading
+import time
+
+import pandas as pd
+
+import instrumentation
+
+
+class TokenBucket:
+    # Limitador de taxa: libera até `rate` requisições por segundo, com rajadas
+    # de no máximo `capacity` requisições
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity or max(1.0, rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, deadline=None):
+        # Bloqueia até haver uma ficha disponível; devolve False se o prazo acabar antes
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return True
+                wait_time = (1 - self.tokens) / self.rate
+            if deadline is not None and time.monotonic() + wait_time > deadline:
+                return False
+            time.sleep(wait_time)
+
+
+def _fetch_one(fetch, ticker, start, end, bucket, retries, backoff, timeout, started):
+    # Busca um ticker com novas tentativas e espera exponencial entre elas
+    with instrumentation.span('fetch.ticker', ticker=ticker) as attrs:
+        closes, status = _fetch_with_retries(fetch, ticker, start, end, bucket, retries,
+                                             backoff, timeout, started)
+        attrs.update(status=status['status'], attempts=status['attempts'])
+    return closes, status
+
+
+def _fetch_with_retries(fetch, ticker, start, end, bucket, retries, backoff, timeout, started):
+    started[ticker] = time.monotonic()
+    deadline = started[ticker] + timeout
+    status = {'status': 'error', 'attempts': 0, 'error': None}
+
+    for attempt in range(retries + 1):
+        if not bucket.acquire(deadline):
+            status['status'] = 'timeout'
+            break
+        status['attempts'] = attempt + 1
+        if attempt:
+            instrumentation.count('fetch_retries')
+        try:
+            closes = fetch([ticker], start, end)
+            if ticker in closes.columns and closes[ticker].notna().any():
+                status['status'] = 'ok'
+                status['error'] = None
+                return closes[ticker], status
+            status['status'] = 'empty'
+        except Exception as e:
+            status['status'] = 'error'
+            status['error'] = str(e)
+
+        delay = backoff * 2 ** attempt
+        if time.monotonic() + delay > deadline:
+            break
+        time.sleep(delay)
+
+    return None, status
+
+
+def fetch_concurrent(fetch, tickers, start, end, max_workers=8, rate=5.0, retries=3,
+                     backoff=0.5, timeout=30.0, deadline=None):
+    # Busca os tickers um a um em paralelo e devolve (painel, status por ticker).
+    # Tickers que estouram o prazo individual (`timeout`, em segundos) ou o prazo
+    # global (`deadline`, instante de time.monotonic()) ficam de fora do painel
+    # com status 'timeout'; os demais resultados são devolvidos mesmo assim.
+    # As threads são daemon (um ThreadPoolExecutor seria esperado na saída do
+    # interpretador): uma requisição pendurada não segura o fim do processo. A
+    # thread de um ticker estourado é abandonada e outra assume a fila, então o
+    # pior caso é cerca de ceil(len(tickers) / max_workers) x timeout
+    tickers = list(tickers)
+    bucket = TokenBucket(rate)
+    started = {}
+    series = {}
+    statuses = {}
+
+    work = queue.Queue()
+    for ticker in tickers:
+        work.put(ticker)
+    results = queue.Queue()
+    stop = threading.Event()
+    # Tickers cuja thread foi substituída; ao voltar, ela não pega mais nada da fila
+    abandoned = set()
+
+    def worker():
+        # Busca tickers da fila até ela acabar, a busca ser abandonada ou o
+        # ticker corrente estourar o prazo
+        while not stop.is_set():
+            try:
+                ticker = work.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                closes, status = _fetch_one(fetch, ticker, start, end, bucket, retries, backoff,
+                                            timeout, started)
+            except Exception as e:
+                closes, status = None, {'status': 'error', 'attempts': None, 'error': str(e)}
+            results.put((ticker, closes, status))
+            if ticker in abandoned:
+                return
+
+    def spawn():
+        threading.Thread(target=worker, name='fetch-worker', daemon=True).start()
+
+    for _ in range(min(max_workers, len(tickers))):
+        spawn()
+    pending = set(tickers)
+
+    try:
+        while pending:
+            now = time.monotonic()
+            # Marca como estourados os tickers que passaram do prazo
+            for ticker in list(pending):
+                expired = ticker in started and now - started[ticker] > timeout
+                if expired or (deadline is not None and now > deadline):
+                    pending.discard(ticker)
+                    statuses[ticker] = {'status': 'timeout', 'attempts': None, 'error': None}
+                    instrumentation.count('fetch_timeouts')
+                    if expired and not work.empty():
+                        # A thread pode estar pendurada: outra assume os tickers da fila
+                        abandoned.add(ticker)
+                        spawn()
+            if not pending:
+                break
+
+            limit = 0.1 if deadline is None else max(0.0, min(0.1, deadline - now))
+            try:
+                ticker, closes, status = results.get(timeout=limit)
+            except queue.Empty:
+                continue
+            # Resultados que chegam depois do prazo do ticker são descartados
+            if ticker in pending:
+                pending.discard(ticker)
+                statuses[ticker] = status
+                if closes is not None:
+                    series[ticker] = closes
+    finally:
+        # Não espera por requisições penduradas: elas terminam em segundo plano,
+        # e os tickers ainda na fila não chegam a ser buscados
+        stop.set()
+
+    panel = pd.DataFrame(series).reindex(columns=tickers).sort_index()
+    return panel, statuses
+
+
+def call_with_deadline(func, deadline, *args):
+    # Executa `func` em outra thread e desiste ao fim do prazo global (instante de
+    # time.monotonic()), levantando TimeoutError. A thread é daemon: uma chamada
+    # pendurada não segura o fim do processo (um ThreadPoolExecutor seria
+    # esperado na saída do interpretador)
+    if deadline is None:
+        return func(*args)
+    results = queue.Queue(maxsize=1)
+
+    def run():
+        try:
+            results.put((True, func(*args)))
+        except BaseException as e:
+            results.put((False, e))
+
+    threading.Thread(target=run, name='deadline-call', daemon=True).start()
+    try:
+        ok, value = results.get(timeout=max(0.0, deadline - time.monotonic()))
+    except queue.Empty:
+        instrumentation.count('fetch_timeouts')
+        raise TimeoutError("prazo global da busca esgotado") from None
+    if not ok:
+        raise value
+    return value
+
+
+def fetch_with_fallback(fetch, tickers, start, end, deadline=None, **options):
+    # Tenta primeiro uma única requisição em lote; os tickers que vierem vazios
+    # são buscados individualmente em paralelo. Tudo respeita o prazo global
+    # `deadline`; `options` vai para fetch_concurrent
+    tickers = list(tickers)
+    try:
+        panel = call_with_deadline(fetch, deadline, tickers, start, end)
+    except Exception as e:
+        instrumentation.warning(f"falha na busca em lote ({e}); buscando ticker a ticker")
+        panel = pd.DataFrame(columns=tickers, dtype=float)
+
+    panel = panel.reindex(columns=tickers)
+    missing = [t for t in tickers if panel[t].isna().all()]
+    if not missing:
+        return panel
+
+    retried, statuses = fetch_concurrent(fetch, missing, start, end, deadline=deadline, **options)
+    for ticker, status in statuses.items():
+        if status['status'] != 'ok':
+            instrumentation.warning(f"{ticker} sem dados ({status['status']})")
+
+    panel = panel.drop(columns=missing).join(retried, how='outer')
+    return panel.reindex(columns=tickers).sort_index()
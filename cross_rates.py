@@ -0,0 +1,89 @@
+import numpy as np
+import pandas as pd
+
+from assets import DXY_TICKER, REGISTRY, Asset, AssetRegistry
+
+# Moeda em que todas as cotações do painel estão expressas
+QUOTE_CURRENCY = 'USD'
+QUOTE_CURRENCY_NAME = 'Dólar Americano'
+
+
+def currency_code(symbol):
+    # 'BRL/USD' -> 'BRL'
+    return symbol.split('/')[0]
+
+
+def available_bases(registry=REGISTRY):
+    # Moedas que podem servir de base: o dólar e todas as moedas cotadas contra ele
+    codes = [currency_code(asset.symbol) for asset in registry
+             if asset.asset_class == 'currency' and asset.ticker != DXY_TICKER]
+    return [QUOTE_CURRENCY] + codes
+
+
+def usd_value_panel(panel, registry=REGISTRY):
+    # Valor em dólares de uma unidade de cada moeda (data x código). Pares XXX/USD
+    # já estão nessa forma; pares USD/XXX são invertidos. O expoente por coluna é o
+    # próprio vetor de sinais do registro (+1 ou -1), aplicado de uma vez
+    assets = [asset for asset in registry
+              if asset.asset_class == 'currency' and asset.ticker != DXY_TICKER]
+    tickers = [asset.ticker for asset in assets]
+    exponents = np.array([asset.sign for asset in assets])
+    values = np.power(panel.reindex(columns=tickers).to_numpy(dtype=np.float64), exponents)
+
+    usd_values = pd.DataFrame(values, index=panel.index,
+                              columns=[currency_code(asset.symbol) for asset in assets])
+    usd_values.insert(0, QUOTE_CURRENCY, 1.0)
+    return usd_values
+
+
+def cross_stale(stale, base, registry=REGISTRY):
+    # Tickers do painel derivado afetados por tickers defasados do painel em
+    # dólar: um cruzamento fica defasado se qualquer uma das duas pontas estiver
+    tickers = {currency_code(asset.symbol): asset.ticker for asset in registry
+               if asset.asset_class == 'currency' and asset.ticker != DXY_TICKER}
+    base_stale = tickers.get(base) in stale
+    result = set()
+    for code in [QUOTE_CURRENCY] + list(tickers):
+        if code != base and (base_stale or tickers.get(code) in stale):
+            result.add(f'{code}/{base}')
+    for asset in registry:
+        if asset.asset_class == 'commodity' and (base_stale or asset.ticker in stale):
+            result.add(f'{asset.ticker}/{base}')
+    return result
+
+
+def cross_panel(panel, base, registry=REGISTRY):
+    # Reexpressa o painel na moeda `base`, sem novos downloads: cada moeda vira o
+    # par XXX/BASE e cada commodity passa a ser cotada em BASE. Devolve o painel
+    # derivado e um registro próprio, com tickers como 'BRL/EUR' e 'CL=F/EUR'
+    usd_values = usd_value_panel(panel, registry)
+    if base not in usd_values.columns:
+        raise ValueError(f"Moeda base desconhecida: {base}")
+    base_usd = usd_values[base].to_numpy()[:, None]
+
+    currency_codes = [code for code in usd_values.columns if code != base]
+    currency_values = usd_values[currency_codes].to_numpy() / base_usd
+
+    commodity_assets = [asset for asset in registry if asset.asset_class == 'commodity']
+    commodity_values = (panel.reindex(columns=[asset.ticker for asset in commodity_assets])
+                        .to_numpy(dtype=np.float64) / base_usd)
+
+    names = {currency_code(asset.symbol): asset.name for asset in registry
+             if asset.asset_class == 'currency' and asset.ticker != DXY_TICKER}
+    names[QUOTE_CURRENCY] = QUOTE_CURRENCY_NAME
+
+    assets = []
+    for code in currency_codes:
+        ticker = f'{code}/{base}'
+        assets.append(Asset(symbol=ticker, ticker=ticker, name=names[code], display_name=names[code],
+                            label=ticker, asset_class='currency', invert=True, sign=1.0))
+    for asset in commodity_assets:
+        ticker = f'{asset.ticker}/{base}'
+        assets.append(Asset(symbol=f'{asset.symbol}/{base}', ticker=ticker, name=asset.name,
+                            display_name=asset.display_name, label=ticker,
+                            asset_class='commodity', invert=False, sign=1.0))
+
+    derived = pd.DataFrame(np.hstack([currency_values, commodity_values]), index=panel.index,
+                           columns=[asset.ticker for asset in assets])
+    return derived, AssetRegistry(assets)
+
@@ -1,173 +1,317 @@
-import yfinance as yf
-import pandas as pd
-from datetime import datetime, timedelta
-
-# Define as moedas e seus tickers no Yahoo Finance com nomes completos
-currencies = {
-    'TRY/USD': {'ticker': 'USDTRY=X', 'name': 'Lira Turca', 'invert': False, 'country_code': 'TR'},
-    'BRL/USD': {'ticker': 'USDBRL=X', 'name': 'Real', 'invert': False, 'country_code': 'BR'},
-    'ARS/USD': {'ticker': 'USDARS=X', 'name': 'Peso Argentino', 'invert': False, 'country_code': 'AR'},
-    'MXN/USD': {'ticker': 'USDMXN=X', 'name': 'Peso Mexicano', 'invert': False, 'country_code': 'MX'},
-    'CAD/USD': {'ticker': 'USDCAD=X', 'name': 'Dólar Canadense', 'invert': False, 'country_code': 'CA'},
-    'EUR/USD': {'ticker': 'EURUSD=X', 'name': 'Euro', 'invert': True, 'country_code': 'EU'},
-    #'ZAR/USD': {'ticker': 'USDZAR=X', 'name': 'Rand Sul-Africano', 'invert': False, 'country_code': 'ZA'},
-    'JPY/USD': {'ticker': 'JPY=X', 'name': 'Iene Japonês', 'invert': False, 'country_code': 'JP'},
-    'CNY/USD': {'ticker': 'USDCNY=X', 'name': 'Yuan Chinês', 'invert': False, 'country_code': 'CN'},
-    'KRW/USD': {'ticker': 'USDKRW=X', 'name': 'Won Sul-Coreano', 'invert': False, 'country_code': 'KR'},
-    'INR/USD': {'ticker': 'USDINR=X', 'name': 'Rúpia Indiana', 'invert': False, 'country_code': 'IN'},
-    'SGD/USD': {'ticker': 'USDSGD=X', 'name': 'Dólar de Singapura', 'invert': False, 'country_code': 'SG'},
-    'NZD/USD': {'ticker': 'NZDUSD=X', 'name': 'Dólar Neozelandês', 'invert': True, 'country_code': 'NZ'},
-    'AUD/USD': {'ticker': 'AUDUSD=X', 'name': 'Dólar Australiano', 'invert': True, 'country_code': 'AU'},
-    'RUB/USD': {'ticker': 'USDRUB=X', 'name': 'Rublo Russo', 'invert': False, 'country_code': 'RU'},
-    'GBP/USD': {'ticker': 'GBPUSD=X', 'name': 'Libra Esterlina', 'invert': True, 'country_code': 'GB'},
-    'HUF/USD': {'ticker': 'USDHUF=X', 'name': 'Florim Húngaro', 'invert': False, 'country_code': 'HU'},
-}
-
-# Adiciona o DXY (Índice do Dólar)
-currencies['DXY'] = {'ticker': 'DX-Y.NYB', 'name': 'DXY', 'invert': False}
-
-# Define as commodities e seus tickers
-commodities = {
-    'CL': {'ticker': 'CL=F', 'name': 'Petróleo WTI', 'invert': False},
-    'BZ': {'ticker': 'BZ=F', 'name': 'Petróleo Brent', 'invert': False},
-    'GC': {'ticker': 'GC=F', 'name': 'Ouro', 'invert': False},
-    'SI': {'ticker': 'SI=F', 'name': 'Prata', 'invert': False},
-    'HG': {'ticker': 'HG=F', 'name': 'Cobre', 'invert': False},
-    'PL': {'ticker': 'PL=F', 'name': 'Platina', 'invert': False},
-    'PA': {'ticker': 'PA=F', 'name': 'Paládio', 'invert': False},
-    'NG': {'ticker': 'NG=F', 'name': 'Gás Natural', 'invert': False},
-    'ZC': {'ticker': 'ZC=F', 'name': 'Milho', 'invert': False},
-    'ZS': {'ticker': 'ZS=F', 'name': 'Soja', 'invert': False},
-    'ZW': {'ticker': 'ZW=F', 'name': 'Trigo', 'invert': False},
-}
+import argparse
+from functools import partial
+from datetime import datetime
 
-if __name__ == "__main__":
-    current_date = datetime.now()
-    current_year = current_date.year
-    performance_data = []
-    commodities_performance = []
-
-    # Função auxiliar para calcular performance
-    def calculate_performance(ticker_info, asset_type='currency'):
-        # Busca dados do ano anterior e atual
-        prior_year_end = datetime(current_year - 1, 12, 31)
-        prior_year_data = yf.download(ticker_info['ticker'], 
-                                    start=prior_year_end - timedelta(days=7), 
-                                    end=prior_year_end)
-        
-        if prior_year_data.empty:
-            return None
-            
-        current_data = yf.download(ticker_info['ticker'], 
-                                 start=f'{current_year}-01-01', 
-                                 end=current_date.strftime('%Y-%m-%d'))
-        
-        if current_data.empty:
-            return None
-
-        # Busca dados da última semana com margem extra para garantir dados
-        week_data = yf.download(ticker_info['ticker'],
-                              start=current_date - timedelta(days=10),  # Aumenta janela para 10 dias
-                              end=current_date)
-        
-        # Calcula performance YTD
-        start_price = prior_year_data['Close'].iloc[-1]
-        end_price = current_data['Close'].iloc[-1]
-        
-        # Aplica inversão apenas para moedas (não para commodities)
-        if asset_type == 'currency':
-            if ticker_info['invert']:
-                # Para moedas que já estão na forma correta (EUR/USD, GBP/USD, etc)
-                ytd_performance = (end_price - start_price) / start_price * 100
-            else:
-                # Para moedas que precisam ser invertidas (USD/BRL, USD/JPY, etc)
-                ytd_performance = -(end_price - start_price) / start_price * 100
-        else:
-            # Para commodities, mantém o cálculo normal
-            ytd_performance = (end_price - start_price) / start_price * 100
-
-        # Calcula performance semanal com tratamento para dados faltantes
-        if not week_data.empty and len(week_data) > 1:
-            week_end_price = week_data['Close'].iloc[-1]
-            
-            # Pega o preço mais próximo de 7 dias atrás
-            week_start_index = week_data.index[-1] - timedelta(days=7)
-            closest_date = min(week_data.index, key=lambda x: abs(x - week_start_index))
-            week_start_price = week_data.loc[closest_date, 'Close']
-            
-            # Aplica inversão apenas para moedas (não para commodities)
-            if asset_type == 'currency':
-                if ticker_info['invert']:
-                    # Para moedas que já estão na forma correta
-                    weekly_performance = (week_end_price - week_start_price) / week_start_price * 100
-                else:
-                    # Para moedas que precisam ser invertidas
-                    weekly_performance = -(week_end_price - week_start_price) / week_start_price * 100
-            else:
-                # Para commodities, mantém o cálculo normal
-                weekly_performance = (week_end_price - week_start_price) / week_start_price * 100
-        else:
-            weekly_performance = 0
-            print(f"Aviso: Sem dados semanais para {ticker_info['ticker']}")
-        
-        return {
-            'Moeda': ticker_info['ticker'],
-            'Base Date': prior_year_data.index[-1].strftime('%Y-%m-%d'),
-            'Current Date': current_data.index[-1].strftime('%Y-%m-%d'),
-            'Preço Base (XXX/USD)': start_price,
-            'Preço Atual (XXX/USD)': end_price,
-            'Performance YTD (%)': ytd_performance,
-            'Performance Semanal (%)': weekly_performance
-        }
-
-    # Calcula performance para cada moeda
-    for currency, info in currencies.items():
-        if currency == 'DXY':
-            continue
-        perf = calculate_performance(info, 'currency')
-        if perf:
-            performance_data.append(perf)
-
-    # Adiciona DXY
-    dxy_data = yf.download('DX-Y.NYB', start=f'{current_year}-01-01', end=current_date.strftime('%Y-%m-%d'))
-    dxy_week_data = yf.download('DX-Y.NYB', start=current_date - timedelta(days=7), end=current_date)
-    
-    if not dxy_data.empty:
-        ytd_perf = (dxy_data['Close'].iloc[-1] - dxy_data['Close'].iloc[0]) / dxy_data['Close'].iloc[0] * 100
-        weekly_perf = (dxy_week_data['Close'].iloc[-1] - dxy_week_data['Close'].iloc[0]) / dxy_week_data['Close'].iloc[0] * 100 if not dxy_week_data.empty else 0
-        
-        performance_data.append({
-            'Moeda': 'DXY',
-            'Base Date': dxy_data.index[0].strftime('%Y-%m-%d'),
-            'Current Date': dxy_data.index[-1].strftime('%Y-%m-%d'),
-            'Preço Base (XXX/USD)': dxy_data['Close'].iloc[0],
-            'Preço Atual (XXX/USD)': dxy_data['Close'].iloc[-1],
-            'Performance YTD (%)': ytd_perf,
-            'Performance Semanal (%)': weekly_perf
-        })
-
-    # Calcula performance para cada commodity
-    for commodity, info in commodities.items():
-        perf = calculate_performance(info, 'commodity')
-        if perf:
-            commodities_performance.append(perf)
-
-    # Criar DataFrames e salvar
-    df_currencies = pd.DataFrame(performance_data)
+import instrumentation
+from assets import REGISTRY
+
+# pandas e os módulos de busca e cálculo são importados dentro das funções, para
+# que a linha de comando (e quem só importa o registro) inicie rápido
+
+# Opções de linha de comando da etapa de dados, compartilhadas com pipeline.py
+def add_data_arguments(parser):
+    parser.add_argument('--source', default='yfinance',
+                        help="fonte de preços: 'yfinance', 'local:<caminho>' ou 'synthetic[:<semente>]'")
+    parser.add_argument('--cache', help='arquivo SQLite do cache de preços (padrão: price_cache.sqlite)')
+    parser.add_argument('--no-cache', action='store_true', help='ignora o cache e baixa tudo novamente')
+    parser.add_argument('--offline', action='store_true', help='usa apenas o cache, sem acessar a rede')
+    parser.add_argument('--invalidate', nargs='*', metavar='TICKER',
+                        help='apaga do cache os tickers informados (ou todos, se nenhum for passado)')
+    parser.add_argument('--evict-before', metavar='YYYY-MM-DD',
+                        help='descarta do cache fechamentos anteriores a esta data')
+    parser.add_argument('--workers', type=int, default=8,
+                        help='buscas simultâneas para tickers que falharem no lote')
+    parser.add_argument('--rate', type=float, default=5.0, help='limite de requisições por segundo')
+    parser.add_argument('--retries', type=int, default=3, help='novas tentativas por ticker')
+    parser.add_argument('--timeout', type=float, default=30.0, help='prazo por ticker, em segundos')
+    parser.add_argument('--deadline', type=float,
+                        help='prazo total da busca, em segundos; o que não chegar a tempo sai do cache, marcado como defasado')
+    parser.add_argument('--shards', type=int,
+                        help='divide o universo entre este número de processos, fundindo os painéis parciais no fim')
+    parser.add_argument('--shard-dir', help='diretório dos painéis parciais (padrão: temporário, apagado no fim)')
+    parser.add_argument('--horizons', default='',
+                        help="horizontes extras separados por vírgula, ex.: '1D,MTD,QTD,1M,3M,6M,1Y,2024-06-01:2024-09-30'")
+
+# Opção de moedas base, usada por quem gera tabelas (não pelo modo contínuo)
+def add_base_argument(parser):
+    parser.add_argument('--base', default='USD',
+                        help="moedas base separadas por vírgula, ex.: 'USD,EUR,BRL' (cruzamentos calculados do painel em dólar)")
+
+# Opções do painel compacto, para históricos longos e universos grandes (backfill)
+def add_panel_arguments(parser):
+    parser.add_argument('--dtype', choices=['float32', 'float64'],
+                        help='guarda os fechamentos em uma matriz compacta deste tipo (float32 usa metade da memória)')
+    parser.add_argument('--memory-budget', metavar='TAMANHO',
+                        help="acima deste tamanho a matriz vai para um arquivo mapeado em memória, ex.: '512M', '2G'")
+    parser.add_argument('--spill-dir', help='diretório dos arquivos temporários do painel (padrão: temporário do sistema)')
+
+# Converte as opções do painel compacto nos argumentos de load_compact_panel (None: painel comum)
+def panel_options(args):
+    from compact_panel import parse_memory_budget
+
+    if args.dtype is None and args.memory_budget is None:
+        return None
+    return {
+        'dtype': args.dtype or 'float64',
+        'memory_budget': parse_memory_budget(args.memory_budget),
+        'spill_dir': args.spill_dir,
+    }
+
+# Converte as opções de linha de comando nos argumentos de load_price_panel
+def data_options(args):
+    return {
+        'source': args.source,
+        'cache_path': args.cache,
+        'use_cache': not args.no_cache,
+        'offline': args.offline,
+        'invalidate': args.invalidate,
+        'evict_before': args.evict_before,
+        'workers': args.workers,
+        'rate': args.rate,
+        'retries': args.retries,
+        'timeout': args.timeout,
+        'deadline': args.deadline,
+        'shards': args.shards,
+        'shard_dir': args.shard_dir,
+    }
+
+# Formatos das tabelas gravadas: colunares e tipados por padrão, CSV como exportação legada
+def add_output_arguments(parser):
+    parser.add_argument('--format', default='arrow',
+                        help="formatos de saída separados por vírgula: 'arrow' (padrão), 'parquet', 'csv'")
+    parser.add_argument('--csv', action='store_true', help="grava também os CSVs legados (o mesmo que incluir 'csv' em --format)")
+
+# Converte as opções de saída na tupla de formatos de save_outputs
+def output_formats(args):
+    from outputs import parse_formats
+
+    formats = parse_formats(args.format)
+    return formats + ('csv',) if args.csv and 'csv' not in formats else formats
+
+# Lista de horizontes a partir do texto separado por vírgulas
+def parse_horizons(text):
+    return [h.strip() for h in text.split(',') if h.strip()]
+
+# Lista de moedas base a partir do texto separado por vírgulas, sem repetições
+def parse_bases(text):
+    return list(dict.fromkeys(b.strip().upper() for b in text.split(',') if b.strip())) or ['USD']
+
+# Prazo padrão (em segundos) da atualização em segundo plano dos tickers defasados
+REFRESH_DEADLINE = 60.0
+
+# Atualiza no cache, em segundo plano, os tickers que ficaram defasados nesta
+# execução, para que a próxima já os encontre em dia. A thread não é daemon, para
+# que a gravação no cache não seja interrompida, mas tem prazo próprio
+# (`deadline`, em segundos): o processo termina no máximo esse tempo depois do relatório
+def refresh_in_background(tickers, start, end, source, cache_path, workers, rate, retries, timeout,
+                          deadline=REFRESH_DEADLINE):
+    import threading
+    import time
+
+    def refresh():
+        from concurrent_fetch import fetch_with_fallback
+        from price_cache import DEFAULT_CACHE_PATH, PriceCache, update_cache
+        from price_sources import get_source
+
+        fetch = partial(fetch_with_fallback, get_source(source).fetch, max_workers=workers,
+                        rate=rate, retries=retries, timeout=timeout,
+                        deadline=time.monotonic() + deadline)
+        try:
+            with instrumentation.span('background_refresh', tickers=len(tickers)):
+                with PriceCache(cache_path or DEFAULT_CACHE_PATH) as cache:
+                    update_cache(cache, fetch, tickers, start, end)
+        except Exception as e:
+            instrumentation.warning(f"falha na atualização em segundo plano ({e})")
+
+    instrumentation.count('background_refreshes')
+    thread = threading.Thread(target=refresh, name='background-refresh')
+    thread.start()
+    return thread
+
+# Carrega o painel de fechamentos (data x ticker) na janela [start, end). Com
+# `deadline` (segundos) a busca inteira tem prazo: tickers que não chegarem a tempo
+# usam o último valor bom do cache, são acrescentados ao conjunto `stale` e
+# atualizados em segundo plano para a próxima execução
+def load_price_panel(tickers, start, end, source='yfinance', cache_path=None,
+                     use_cache=True, offline=False, invalidate=None, evict_before=None,
+                     workers=8, rate=5.0, retries=3, timeout=30.0, deadline=None, stale=None,
+                     shards=None, shard_dir=None, refresh=True):
+    import time
+
+    from concurrent_fetch import fetch_with_fallback
+    from price_cache import DEFAULT_CACHE_PATH, PriceCache, empty_tickers, update_cache
+    from price_sources import get_source
+
+    if shards and shards > 1:
+        from sharded_fetch import fetch_sharded
+
+        return fetch_sharded(tickers, start, end, shards, shard_dir, stale=stale, source=source,
+                             cache_path=cache_path, use_cache=use_cache, offline=offline,
+                             invalidate=invalidate, evict_before=evict_before, workers=workers,
+                             rate=rate, retries=retries, timeout=timeout, deadline=deadline)
+
+    price_source = get_source(source)
+    # Busca em lote; tickers que vierem vazios são buscados em paralelo, com
+    # limite de taxa, novas tentativas e prazo por ticker
+    fetch = partial(fetch_with_fallback, price_source.fetch, max_workers=workers,
+                    rate=rate, retries=retries, timeout=timeout,
+                    deadline=None if deadline is None else time.monotonic() + deadline)
+    stale = set() if stale is None else stale
+
+    # Fontes locais e sintéticas não passam pelo cache, que guarda só dados reais.
+    # Sem cache não há valor anterior a servir: os tickers vazios ficam sem dados
+    if not use_cache or source != 'yfinance':
+        panel = fetch(tickers, start, end)
+        stale.update(empty_tickers(panel, tickers))
+        return panel
+
+    # Usa o cache local e baixa apenas o trecho que ainda falta de cada ticker
+    with PriceCache(cache_path or DEFAULT_CACHE_PATH) as cache:
+        if invalidate is not None:
+            cache.invalidate(invalidate or None)
+        if evict_before:
+            cache.evict(before=evict_before, keep_tickers=tickers)
+
+        if offline:
+            return cache.load(tickers, start=start, end=end)
+        failed = set()
+        panel = update_cache(cache, fetch, tickers, start, end, stale=failed)
+
+    if failed:
+        stale.update(failed)
+        instrumentation.warning(f"{len(failed)} ativos servidos do cache (defasados): {', '.join(sorted(failed))}")
+        if refresh:
+            refresh_in_background(sorted(failed), start, end, source, cache_path, workers, rate, retries, timeout)
+    return panel
+
+# Invalidação e descarte do cache para o universo `tickers`, feitos uma vez
+# quando a busca é dividida em blocos ou shards
+def prepare_cache(tickers, cache_path=None, invalidate=None, evict_before=None):
+    from price_cache import DEFAULT_CACHE_PATH, PriceCache
+
+    if invalidate is None and not evict_before:
+        return
+    with PriceCache(cache_path or DEFAULT_CACHE_PATH) as cache:
+        if invalidate is not None:
+            cache.invalidate(invalidate or None)
+        if evict_before:
+            cache.evict(before=evict_before, keep_tickers=tickers)
+
+# Carrega o painel como CompactPanel (matriz contígua float32/float64, indo para
+# memmap acima de `memory_budget`). Com o cache, os tickers são atualizados e
+# lidos em blocos e nenhum DataFrame largo é montado; as outras fontes ainda
+# passam por um painel comum antes da conversão
+def load_compact_panel(tickers, start, end, dtype='float64', memory_budget=None, spill_dir=None,
+                       chunk_size=None, **options):
+    from compact_panel import CHUNK_SIZE, DTYPES, CompactPanel, load_compact
+    from price_cache import DEFAULT_CACHE_PATH, PriceCache
+
+    dtype = DTYPES[dtype]
+    chunk_size = chunk_size or CHUNK_SIZE
+    tickers = list(tickers)
+    if not options.get('use_cache', True) or options.get('source', 'yfinance') != 'yfinance':
+        panel = load_price_panel(tickers, start, end, **options)
+        return CompactPanel.from_frame(panel.reindex(columns=tickers), dtype, memory_budget, spill_dir)
+
+    cache_path = options.get('cache_path') or DEFAULT_CACHE_PATH
+    # Rodam uma vez antes dos blocos: o descarte por bloco apagaria os tickers dos outros
+    prepare_cache(tickers, cache_path, options.pop('invalidate', None), options.pop('evict_before', None))
+
+    if not options.get('offline'):
+        for i in range(0, len(tickers), chunk_size):
+            with instrumentation.span('fetch.chunk', tickers=len(tickers[i:i + chunk_size])):
+                load_price_panel(tickers[i:i + chunk_size], start, end, **options)
+
+    with PriceCache(cache_path) as cache:
+        return load_compact(cache, tickers, start, end, dtype, memory_budget, spill_dir, chunk_size)
+
+# Calcula as tabelas de performance de moedas e commodities a partir do painel.
+# A coluna 'Stale' marca os ativos servidos do cache por não terem chegado no prazo
+def build_performance_tables(panel, current_date, horizons=(), registry=REGISTRY, stale=()):
+    from performance import compute_performance
+
+    # Calcula YTD, semanal e horizontes extras de todos os ativos em uma única passada vetorizada
+    tickers = list(registry.tickers())
+    results = compute_performance(panel.reindex(columns=tickers), registry.signs(),
+                                  current_date, horizons)
+    results['Stale'] = results['Moeda'].isin(set(stale))
+    return split_performance_tables(results, registry)
+
+# Separa o resultado de compute_performance nas tabelas de moedas e de commodities,
+# com os rótulos de saída e ordenadas pela performance YTD
+def split_performance_tables(results, registry=REGISTRY):
+    currency_tickers = set(registry.tickers('currency'))
+    df_currencies = results[results['Moeda'].isin(currency_tickers)].copy()
+    df_currencies['Moeda'] = registry.labels(df_currencies['Moeda'])
     df_currencies = df_currencies.sort_values(by='Performance YTD (%)', ascending=False)
-    
-    df_commodities = pd.DataFrame(commodities_performance)
+
+    commodity_tickers = set(registry.tickers('commodity'))
+    df_commodities = results[results['Moeda'].isin(commodity_tickers)]
     df_commodities = df_commodities.sort_values(by='Performance YTD (%)', ascending=False)
+
+    return df_currencies.reset_index(drop=True), df_commodities.reset_index(drop=True)
+
+# Baixa de uma vez o painel de fechamentos de todos os ativos, do início do
+# horizonte mais longo (no mínimo o fim do ano anterior, com margem de 7 dias) até hoje
+def fetch_panel(current_date=None, horizons=(), **options):
+    from performance import history_start
+
+    current_date = current_date or datetime.now()
+    start = history_start(horizons, current_date)
+    end = current_date.strftime('%Y-%m-%d')
+    with instrumentation.span('fetch'):
+        return load_price_panel(list(REGISTRY.tickers()), start, end, **options)
+
+# Painel e registro cotados na moeda `base`. Em dólar é o próprio painel; nas
+# demais bases os pares são triangulados a partir dele, sem novos downloads
+def panel_for_base(panel, base):
+    from cross_rates import QUOTE_CURRENCY, cross_panel
+
+    if base == QUOTE_CURRENCY:
+        return panel, REGISTRY
+    return cross_panel(panel, base)
+
+# Tabelas de performance contra a moeda `base`, junto com o registro a ser usado
+# nos gráficos. `stale` são os tickers do painel em dólar servidos do cache
+def performance_for_base(panel, base, current_date, horizons=(), stale=()):
+    from cross_rates import QUOTE_CURRENCY, cross_stale
+
+    with instrumentation.span('compute', base=base):
+        base_panel, registry = panel_for_base(panel, base)
+        if base != QUOTE_CURRENCY:
+            stale = cross_stale(stale, base)
+        return (*build_performance_tables(base_panel, current_date, horizons, registry, stale), registry)
+
+# Busca os preços e calcula as tabelas de performance em um único passo
+def fetch_performance(current_date=None, horizons=(), **options):
+    current_date = current_date or datetime.now()
+    panel = fetch_panel(current_date, horizons, **options)
+    with instrumentation.span('compute'):
+        return build_performance_tables(panel, current_date, horizons)
+
+# Grava as tabelas de performance e os registros de ativos em cada formato de
+# `formats` (Arrow IPC por padrão; veja outputs.py). Com `suffix` (ex.: '_EUR')
+# as tabelas de uma moeda base ganham arquivos próprios, com o registro dessa base
+def save_outputs(df_currencies, df_commodities, suffix='', formats=None, registry=REGISTRY, directory='.'):
+    from outputs import DEFAULT_FORMATS, save_tables
+
+    save_tables(df_currencies, df_commodities, suffix, formats or DEFAULT_FORMATS, registry, directory)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Calcula a performance de moedas e commodities')
+    add_data_arguments(parser)
+    add_base_argument(parser)
+    add_output_arguments(parser)
+    args = parser.parse_args()
+
+    current_date = datetime.now()
+    horizons = parse_horizons(args.horizons)
+    stale = set()
+    panel = fetch_panel(current_date, horizons, stale=stale, **data_options(args))
+    for base in parse_bases(args.base):
+        df_currencies, df_commodities, registry = performance_for_base(panel, base, current_date,
+                                                                       horizons, stale)
+        save_outputs(df_currencies, df_commodities, '' if base == 'USD' else f'_{base}',
+                     output_formats(args), registry)
     
-    # Salvar dados em CSV
-    df_currencies.to_csv('currency_data.csv', index=False)
-    df_commodities.to_csv('commodity_data.csv', index=False)
-    
-    # Salvar dicionários em CSV
-    currencies_df = pd.DataFrame.from_dict(currencies, orient='index')
-    currencies_df.to_csv('currencies_info.csv')
-    
-    commodities_df = pd.DataFrame.from_dict(commodities, orient='index')
-    commodities_df.to_csv('commodities_info.csv')
-    
-    print("✅ Dados salvos com sucesso!") 
\ No newline at end of file
+    print("✅ Dados salvos com sucesso!")
\ No newline at end of file
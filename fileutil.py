@@ -0,0 +1,25 @@
+import os
+import secrets
+
+
+def atomic_write(path, data):
+    # Grava em um arquivo temporário no mesmo diretório e troca de uma vez, para
+    # que leitores nunca vejam um arquivo pela metade. O temporário é criado com
+    # modo 0666, como um open() comum, e o umask do processo se aplica
+    # normalmente (sem trocá-lo, o que afetaria as outras threads)
+    directory = os.path.dirname(os.path.abspath(path))
+    suffix = os.path.splitext(path)[1]
+    while True:
+        tmp_path = os.path.join(directory, f'.tmp-{secrets.token_hex(8)}{suffix}')
+        try:
+            fd = os.open(tmp_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY | getattr(os, 'O_BINARY', 0), 0o666)
+            break
+        except FileExistsError:
+            continue
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
@@ -0,0 +1,144 @@
+import cProfile
+import json
+import os
+import pstats
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# Variável de ambiente que liga o cProfile nos trechos marcados com `profiled`
+PROFILE_ENV = 'MACRO_PROFILE'
+
+# Spans e avisos guardados individualmente; nos modos contínuos (watch, serviço)
+# os mais antigos são descartados. Os totais por etapa e os contadores continuam exatos
+MAX_SPANS = 10000
+MAX_WARNINGS = 1000
+
+_lock = threading.Lock()
+_local = threading.local()
+_spans = deque(maxlen=MAX_SPANS)
+_totals = {}
+_counters = {}
+_warnings = deque(maxlen=MAX_WARNINGS)
+
+
+def reset():
+    # Descarta tudo o que foi registrado até agora
+    with _lock:
+        _spans.clear()
+        _totals.clear()
+        _counters.clear()
+        _warnings.clear()
+
+
+@contextmanager
+def span(name, **attrs):
+    # Mede a duração de uma etapa. Spans aninhados guardam o nome do span pai,
+    # o que permite separar, por exemplo, 'fetch' de 'fetch.ticker'
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+    parent = stack[-1] if stack else None
+    stack.append(name)
+    start = time.perf_counter()
+    wall_start = time.time()
+    try:
+        yield attrs
+    finally:
+        duration = time.perf_counter() - start
+        stack.pop()
+        with _lock:
+            _spans.append({
+                'name': name,
+                'parent': parent,
+                'start': wall_start,
+                'seconds': duration,
+                'thread': threading.current_thread().name,
+                **attrs,
+            })
+            total = _totals.setdefault(name, {'count': 0, 'seconds': 0.0})
+            total['count'] += 1
+            total['seconds'] += duration
+
+
+def count(name, value=1):
+    # Incrementa um contador (chamadas de rede, bytes, acertos de cache, linhas...).
+    # Escalares do numpy viram int/float do Python, para que os contadores
+    # continuem serializáveis em JSON
+    if hasattr(value, 'item'):
+        value = value.item()
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def warning(message):
+    # Registra e imprime um aviso de execução
+    count('warnings')
+    with _lock:
+        _warnings.append(message)
+    print(f"Aviso: {message}")
+
+
+def snapshot():
+    # Cópia do estado atual, com o tempo total por nome de span (de todos os
+    # spans, mesmo dos já descartados)
+    with _lock:
+        spans = list(_spans)
+        totals = {name: dict(total) for name, total in _totals.items()}
+        counters = dict(_counters)
+        warnings = list(_warnings)
+
+    return {'spans': spans, 'totals': totals, 'counters': counters, 'warnings': warnings}
+
+
+def write_json(path):
+    with open(path, 'w') as f:
+        json.dump(snapshot(), f, indent=2, default=str)
+
+
+def write_openmetrics(path):
+    # Formato texto do OpenMetrics: tempo e contagem por etapa, mais os contadores
+    data = snapshot()
+    lines = [
+        '# TYPE macro_stage_seconds counter',
+        '# HELP macro_stage_seconds Tempo total gasto em cada etapa.',
+    ]
+    for name, total in sorted(data['totals'].items()):
+        lines.append(f'macro_stage_seconds_total{{stage="{name}"}} {total["seconds"]:.6f}')
+    lines.append('# TYPE macro_stage_runs counter')
+    for name, total in sorted(data['totals'].items()):
+        lines.append(f'macro_stage_runs_total{{stage="{name}"}} {total["count"]}')
+    lines.append('# TYPE macro_events counter')
+    for name, value in sorted(data['counters'].items()):
+        lines.append(f'macro_events_total{{event="{name}"}} {value}')
+    lines.append('# EOF')
+    with open(path, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+
+
+def write_trace(path):
+    # Escolhe o formato pela extensão: .prom/.txt para OpenMetrics, JSON nos demais casos
+    if path.endswith('.prom') or path.endswith('.txt'):
+        write_openmetrics(path)
+    else:
+        write_json(path)
+
+
+@contextmanager
+def profiled(path=None):
+    # Roda o trecho sob cProfile quando `path` é informado ou MACRO_PROFILE aponta
+    # para um arquivo; grava as estatísticas (.prof) e imprime as 20 funções mais caras
+    path = path or os.environ.get(PROFILE_ENV)
+    if not path:
+        yield None
+        return
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
+        pstats.Stats(profiler).sort_stats('cumulative').print_stats(20)
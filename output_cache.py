@@ -0,0 +1,122 @@
+import hashlib
+import os
+
+import instrumentation
+from fileutil import atomic_write
+
+# Diretório padrão do cache de gráficos e relatórios já renderizados
+DEFAULT_OUTPUT_CACHE = '.report_cache'
+
+# Tamanho máximo do cache antes de descartar as entradas menos usadas
+DEFAULT_MAX_BYTES = 256 * 2 ** 20
+
+# Muda quando o formato dos gráficos ou do PDF muda, invalidando tudo o que foi salvo
+CACHE_VERSION = '1'
+
+
+def _update(digest, part):
+    # Acrescenta ao hash uma parte da chave: DataFrames pelo conteúdo (valores,
+    # índice, colunas e tipos), registros pelos ativos, sequências item a item
+    import pandas as pd
+
+    from assets import AssetRegistry
+
+    if isinstance(part, pd.DataFrame):
+        digest.update(b'frame')
+        digest.update(repr((list(part.columns), [str(t) for t in part.dtypes])).encode())
+        digest.update(pd.util.hash_pandas_object(part, index=True).to_numpy().tobytes())
+    elif isinstance(part, AssetRegistry):
+        digest.update(b'registry')
+        digest.update(repr(part.assets).encode())
+    elif isinstance(part, (tuple, list)):
+        digest.update(f'seq{len(part)}'.encode())
+        for item in part:
+            _update(digest, item)
+    else:
+        digest.update(repr(part).encode())
+    digest.update(b'\0')
+
+
+def content_key(kind, *parts):
+    # Chave de conteúdo de uma saída: muda se qualquer linha de entrada, o
+    # registro ou uma configuração de renderização mudar
+    digest = hashlib.sha256(f'{kind}:{CACHE_VERSION}\0'.encode())
+    for part in parts:
+        _update(digest, part)
+    return f'{kind}-{digest.hexdigest()}'
+
+
+class OutputCache:
+    # Gráficos e PDFs já renderizados, um arquivo por chave de conteúdo. A data
+    # de modificação marca o último uso; acima de `max_bytes` as entradas menos
+    # usadas são descartadas. O tamanho total é acompanhado a cada gravação, e o
+    # diretório só é varrido quando ele passa do limite
+
+    def __init__(self, directory=DEFAULT_OUTPUT_CACHE, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._total = None
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key)
+
+    def get(self, key):
+        # Devolve os bytes salvos (marcando o uso) ou None
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            instrumentation.count('output_cache_misses')
+            return None
+        os.utime(path)
+        instrumentation.count('output_cache_hits')
+        return data
+
+    def put(self, key, data):
+        path = self._path(key)
+        if self._total is not None:
+            try:
+                self._total -= os.path.getsize(path)
+            except FileNotFoundError:
+                pass
+        atomic_write(path, data)
+        if self._total is None or self._total + len(data) > self.max_bytes:
+            # Primeira gravação ou limite estourado: varre o diretório, o que também
+            # corrige o total se outro processo tiver gravado no mesmo cache
+            self.evict()
+        else:
+            self._total += len(data)
+
+    def evict(self, max_bytes=None):
+        # Remove as entradas menos usadas até o total caber em `max_bytes`
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and not entry.name.startswith('.tmp-'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= max_bytes:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            instrumentation.count('output_cache_evictions')
+        self._total = total
+
+    def clear(self):
+        self.evict(0)
+
+    def fetch(self, key, build):
+        # Bytes da chave, gerados por `build()` e guardados só quando não estão no cache
+        data = self.get(key)
+        if data is None:
+            data = build()
+            self.put(key, data)
+        return data
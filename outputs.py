@@ -0,0 +1,200 @@
+import os
+
+import instrumentation
+from assets import REGISTRY
+from fileutil import atomic_write
+
+# Versão do esquema das saídas colunares, gravada nos metadados de cada arquivo.
+# Leitores recusam arquivos de uma versão mais nova do que a que conhecem
+SCHEMA_VERSION = 1
+
+# Formatos de saída: 'arrow' (Arrow IPC, lido por memory map sem cópia),
+# 'parquet' (compacto, para arquivamento) e 'csv' (exportação legada, sem tipos)
+OUTPUT_FORMATS = ('arrow', 'parquet', 'csv')
+DEFAULT_FORMATS = ('arrow',)
+EXTENSIONS = {'arrow': '.arrow', 'parquet': '.parquet', 'csv': '.csv'}
+
+# Preferência entre saídas gravadas no mesmo instante, ao ler uma saída sem extensão
+READ_ORDER = ('arrow', 'parquet', 'csv')
+
+PERFORMANCE_FIXED_COLUMNS = [
+    ('Moeda', 'string'),
+    ('Base Date', 'date'),
+    ('Current Date', 'date'),
+    ('Preço Base (XXX/USD)', 'float'),
+    ('Preço Atual (XXX/USD)', 'float'),
+    ('Performance YTD (%)', 'float'),
+    ('Performance Semanal (%)', 'float'),
+]
+
+REGISTRY_COLUMNS = [
+    ('symbol', 'string'),
+    ('ticker', 'string'),
+    ('name', 'string'),
+    ('display_name', 'string'),
+    ('label', 'string'),
+    ('asset_class', 'string'),
+    ('invert', 'bool'),
+    ('sign', 'float'),
+    ('country_code', 'string'),
+]
+
+
+def arrow_available():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def parse_formats(text):
+    # 'arrow,csv' -> ('arrow', 'csv'), validando cada formato
+    formats = tuple(dict.fromkeys(f.strip().lower() for f in text.split(',') if f.strip()))
+    for fmt in formats:
+        if fmt not in OUTPUT_FORMATS:
+            raise ValueError(f"Formato de saída desconhecido: {fmt}")
+    return formats or DEFAULT_FORMATS
+
+
+def _arrow_type(kind):
+    import pyarrow as pa
+
+    return {'string': pa.string(), 'date': pa.date32(), 'float': pa.float64(), 'bool': pa.bool_()}[kind]
+
+
+def performance_schema(df, kind='performance'):
+    # Esquema tipado de uma tabela de performance: colunas fixas mais um float64
+    # por horizonte extra ('Performance 3M (%)'...) e a marca booleana 'Stale'
+    import pyarrow as pa
+
+    fixed = dict(PERFORMANCE_FIXED_COLUMNS)
+    fields = [pa.field(name, _arrow_type(t)) for name, t in PERFORMANCE_FIXED_COLUMNS]
+    fields += [pa.field(col, pa.bool_() if df[col].dtype == bool else pa.float64())
+               for col in df.columns if col not in fixed]
+    return pa.schema(fields, metadata={'macro.schema_version': str(SCHEMA_VERSION), 'macro.kind': kind})
+
+
+def registry_schema():
+    import pyarrow as pa
+
+    fields = [pa.field(name, _arrow_type(t), nullable=name == 'country_code') for name, t in REGISTRY_COLUMNS]
+    return pa.schema(fields, metadata={'macro.schema_version': str(SCHEMA_VERSION), 'macro.kind': 'registry'})
+
+
+def registry_frame(registry=REGISTRY, asset_class=None):
+    # Ativos do registro como tabela, uma linha por ativo
+    import pandas as pd
+
+    rows = [[getattr(asset, name) for name, _ in REGISTRY_COLUMNS]
+            for asset in registry if asset_class is None or asset.asset_class == asset_class]
+    return pd.DataFrame(rows, columns=[name for name, _ in REGISTRY_COLUMNS])
+
+
+def _to_arrow(df, schema):
+    import pandas as pd
+    import pyarrow as pa
+
+    df = df.copy()
+    for field in schema:
+        if pa.types.is_date32(field.type):
+            df[field.name] = pd.to_datetime(df[field.name]).dt.date
+    return pa.Table.from_pandas(df[schema.names], schema=schema, preserve_index=False)
+
+
+def write_table(df, path, schema):
+    # Grava o DataFrame no formato indicado pela extensão (.arrow ou .parquet),
+    # de forma atômica para que leitores concorrentes nunca vejam um arquivo parcial
+    import pyarrow as pa
+
+    table = _to_arrow(df, schema)
+    sink = pa.BufferOutputStream()
+    if path.endswith('.parquet'):
+        import pyarrow.parquet as pq
+
+        pq.write_table(table, sink)
+    else:
+        # Sem compressão: o leitor mapeia o arquivo e usa os buffers diretamente
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    atomic_write(path, sink.getvalue().to_pybytes())
+
+
+def check_schema(schema, path):
+    metadata = schema.metadata or {}
+    version = int(metadata.get(b'macro.schema_version', b'0'))
+    if version > SCHEMA_VERSION:
+        raise ValueError(f"{path}: versão de esquema {version} não suportada (máximo {SCHEMA_VERSION})")
+    return version
+
+
+def read_arrow(path):
+    # Lê a saída como tabela Arrow. Arquivos .arrow são mapeados em memória e os
+    # buffers numéricos apontam direto para o arquivo, sem cópia nem parsing
+    import pyarrow as pa
+
+    if path.endswith('.parquet'):
+        import pyarrow.parquet as pq
+
+        table = pq.read_table(path, memory_map=True)
+    else:
+        # O mapa fica aberto enquanto houver buffers da tabela apontando para ele
+        table = pa.ipc.open_file(pa.memory_map(path, 'r')).read_all()
+    check_schema(table.schema, path)
+    return table
+
+
+def read_output(stem, fmt=None):
+    # Lê uma saída pelo nome sem extensão ('currency_data'). Sem `fmt`, usa a
+    # gravada por último (um .arrow antigo não vence um .csv novo), com os
+    # formatos tipados como desempate; sem pyarrow, só o CSV é considerado
+    import pandas as pd
+
+    candidates = []
+    for rank, name in enumerate(READ_ORDER):
+        path = stem + EXTENSIONS[name]
+        if (fmt is None or name == fmt) and os.path.exists(path) and (name == 'csv' or arrow_available()):
+            candidates.append((-os.path.getmtime(path), rank, name, path))
+    if not candidates:
+        raise FileNotFoundError(f"Nenhuma saída encontrada para {stem}")
+
+    _, _, name, path = min(candidates)
+    if name == 'csv':
+        return pd.read_csv(path)
+    return read_arrow(path).to_pandas(date_as_object=False, split_blocks=True)
+
+
+def _resolve_formats(formats):
+    # Sem pyarrow só o CSV legado pode ser gravado
+    if arrow_available() or all(fmt == 'csv' for fmt in formats):
+        return formats
+    instrumentation.warning("pyarrow não instalado; gravando as saídas em CSV")
+    return ('csv',)
+
+
+def save_tables(df_currencies, df_commodities, suffix='', formats=DEFAULT_FORMATS, registry=REGISTRY,
+                directory='.'):
+    # Grava as tabelas de performance e os registros de moedas e commodities
+    # (currency_data, commodity_data, currencies_info, commodities_info) em cada formato
+    outputs = [
+        ('currency_data', df_currencies, 'performance'),
+        ('commodity_data', df_commodities, 'performance'),
+        ('currencies_info', registry_frame(registry, 'currency'), 'registry'),
+        ('commodities_info', registry_frame(registry, 'commodity'), 'registry'),
+    ]
+    for fmt in _resolve_formats(formats):
+        for name, df, kind in outputs:
+            path = os.path.join(directory, f'{name}{suffix}{EXTENSIONS[fmt]}')
+            with instrumentation.span('save', output=name, format=fmt):
+                if fmt == 'csv':
+                    if kind == 'registry':
+                        # Mesmo layout dos CSVs antigos: símbolo no índice sem nome (primeira
+                        # célula do cabeçalho vazia), só as colunas preenchidas
+                        df = df.set_index('symbol')[['ticker', 'name', 'invert', 'country_code']]
+                        df.index.name = None
+                        df.dropna(axis=1, how='all').to_csv(path)
+                    else:
+                        df.to_csv(path, index=False)
+                else:
+                    schema = performance_schema(df) if kind == 'performance' else registry_schema()
+                    write_table(df, path, schema)
@@ -0,0 +1,278 @@
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+import instrumentation
+from compact_panel import CompactPanel, allocate, block_columns
+
+# Colunas da tabela de performance consumida por report_generator.py
+OUTPUT_COLUMNS = [
+    'Moeda',
+    'Base Date',
+    'Current Date',
+    'Preço Base (XXX/USD)',
+    'Preço Atual (XXX/USD)',
+    'Performance YTD (%)',
+    'Performance Semanal (%)',
+]
+
+# Horizontes pré-definidos: períodos corridos (até a data) e janelas móveis
+PERIOD_HORIZONS = {'WTD': 'W', 'MTD': 'M', 'QTD': 'Q', 'YTD': 'Y'}
+ROLLING_HORIZONS = {
+    '1W': pd.DateOffset(weeks=1),
+    '2W': pd.DateOffset(weeks=2),
+    '1M': pd.DateOffset(months=1),
+    '3M': pd.DateOffset(months=3),
+    '6M': pd.DateOffset(months=6),
+    '1Y': pd.DateOffset(years=1),
+    '2Y': pd.DateOffset(years=2),
+    '3Y': pd.DateOffset(years=3),
+    '5Y': pd.DateOffset(years=5),
+}
+
+
+def horizon_column(horizon):
+    # Nome da coluna de saída de um horizonte
+    return f'Performance {horizon} (%)'
+
+
+def period_start(reference, period):
+    # Primeiro dia da semana, mês, trimestre ou ano que contém `reference`
+    reference = pd.Timestamp(reference).normalize()
+    if period == 'W':
+        return reference - pd.Timedelta(days=reference.weekday())
+    if period == 'M':
+        return reference.replace(day=1)
+    if period == 'Q':
+        return reference.replace(month=3 * ((reference.month - 1) // 3) + 1, day=1)
+    return reference.replace(month=1, day=1)
+
+
+def parse_custom_horizon(horizon):
+    # Intervalos personalizados: 'AAAA-MM-DD:AAAA-MM-DD' ou só 'AAAA-MM-DD' (até hoje)
+    start, _, end = horizon.partition(':')
+    try:
+        return pd.Timestamp(start), pd.Timestamp(end) if end else None
+    except ValueError:
+        raise ValueError(f"Horizonte desconhecido: {horizon}")
+
+
+def history_start(horizons, current_date):
+    # Data mais antiga necessária para calcular todos os horizontes pedidos
+    today = pd.Timestamp(current_date.date())
+    earliest = pd.Timestamp(today.year - 1, 12, 31)
+    for horizon in horizons:
+        if horizon == '1D':
+            anchor = today - pd.Timedelta(days=7)
+        elif horizon in PERIOD_HORIZONS:
+            anchor = period_start(today, PERIOD_HORIZONS[horizon])
+        elif horizon in ROLLING_HORIZONS:
+            anchor = today - ROLLING_HORIZONS[horizon]
+        else:
+            anchor = parse_custom_horizon(horizon)[0]
+        earliest = min(earliest, anchor)
+    # Margem para feriados e fins de semana antes da âncora
+    return earliest - timedelta(days=7)
+
+
+def valid_positions(valid, memory_budget=None, spill_dir=None, block_budget=None):
+    # Para cada célula da matriz, a linha da última cotação válida em ou antes
+    # dela (-1 se não houver) e a da primeira válida em ou depois (n se não houver).
+    # Posições em int32: com o painel em float32 elas seriam o maior gasto de
+    # memória. As matrizes seguem o orçamento (memmap acima dele) e são
+    # preenchidas em blocos de colunas (dimensionados por `block_budget`), sem
+    # temporários do tamanho do painel
+    n, width = valid.shape
+    rows = np.arange(n, dtype=np.int32)[:, None]
+    prev_valid, _ = allocate(valid.shape, np.int32, memory_budget, spill_dir, fill=None)
+    next_valid, _ = allocate(valid.shape, np.int32, memory_budget, spill_dir, fill=None)
+    step = block_columns(n, 4, memory_budget if block_budget is None else block_budget)
+    for start in range(0, width, step):
+        block = slice(start, start + step)
+        np.maximum.accumulate(np.where(valid[:, block], rows, -1), axis=0, out=prev_valid[:, block])
+        np.minimum.accumulate(np.where(valid[:, block], rows, n)[::-1], axis=0,
+                              out=next_valid[::-1, block])
+    return prev_valid, next_valid
+
+
+def horizon_positions(horizon, dates, prev_valid, end_pos, columns):
+    # Devolve (posição base, posição final) de cada ativo para um horizonte, usando
+    # busca binária no índice de datas ordenado; -1 quando não há cotação
+    if horizon == '1D':
+        # Fechamento anterior ao último de cada ativo
+        base = np.where(end_pos > 0, prev_valid[np.maximum(end_pos - 1, 0), columns], -1)
+        return base, end_pos
+
+    if horizon in PERIOD_HORIZONS or horizon in ROLLING_HORIZONS:
+        if horizon in PERIOD_HORIZONS:
+            # Base: último fechamento antes do início do período corrente
+            anchor = period_start(dates[-1], PERIOD_HORIZONS[horizon])
+            k = np.searchsorted(dates, np.datetime64(anchor)) - 1
+        else:
+            # Base: último fechamento em ou antes de (último fechamento - janela)
+            anchor = pd.DatetimeIndex(dates[np.maximum(end_pos, 0)]) - ROLLING_HORIZONS[horizon]
+            k = np.searchsorted(dates, anchor.values, side='right') - 1
+        base = np.where(k >= 0, prev_valid[np.maximum(k, 0), columns], -1)
+        return base, end_pos
+
+    start, end = parse_custom_horizon(horizon)
+    k = np.searchsorted(dates, np.datetime64(start), side='right') - 1
+    base = np.where(k >= 0, prev_valid[max(k, 0), columns], -1)
+    if end is not None:
+        k = np.searchsorted(dates, np.datetime64(end), side='right') - 1
+        end_pos = np.where(k >= 0, prev_valid[max(k, 0), columns], -1)
+    return base, end_pos
+
+
+def compute_performance(panel, signs, current_date, horizons=()):
+    # Calcula YTD e semanal para todos os ativos do painel (data x ticker) de uma
+    # vez. `signs` tem +1 ou -1 por coluna: -1 inverte cotações USD/XXX para que
+    # a alta represente valorização da moeda contra o dólar. Cada horizonte extra
+    # em `horizons` ('1D', 'WTD', 'MTD', 'QTD', '1M', '3M', '6M', '1Y', ou um
+    # intervalo 'AAAA-MM-DD:AAAA-MM-DD') vira uma coluna a mais na saída
+    today = pd.Timestamp(current_date.date())
+    if isinstance(panel, CompactPanel):
+        panel = panel.window(end=today)
+    else:
+        panel = panel[panel.index < today]
+    arrays = prepare_panel(panel)
+    return snapshot_performance(arrays, signs, today, horizons)
+
+
+def prepare_panel(panel):
+    # Ordena o painel e pré-calcula as matrizes usadas por snapshot_performance.
+    # As posições válidas dependem só das linhas anteriores (ou da próxima linha
+    # válida, checada contra a data de corte), então servem para qualquer data de referência.
+    # Um CompactPanel (já ordenado) é usado como está, em float32 ou float64 e
+    # mesmo em memmap, sem cópia da matriz de fechamentos. O orçamento de memória
+    # do painel vale também para as matrizes derivadas: se elas e os fechamentos
+    # não couberem juntos nele, vão todas para memmap (orçamento 0), e os blocos
+    # de colunas são dimensionados pelo orçamento original
+    memory_budget = block_budget = spill_dir = None
+    if isinstance(panel, CompactPanel):
+        values = panel.values
+        dates = panel.dates
+        block_budget = panel.memory_budget
+        spill_dir = panel.spill_dir
+        if block_budget is not None:
+            derived = values.shape[0] * values.shape[1] * 9
+            fits = not panel.spilled and values.nbytes + derived <= block_budget
+            memory_budget = block_budget if fits else 0
+    else:
+        panel = panel.sort_index()
+        values = panel.to_numpy(dtype=np.float64)
+        dates = panel.index.values
+
+    valid, _ = allocate(values.shape, np.bool_, memory_budget, spill_dir, fill=None)
+    step = block_columns(values.shape[0], values.dtype.itemsize, block_budget)
+    for start in range(0, values.shape[1], step):
+        block = valid[:, start:start + step]
+        np.isnan(values[:, start:start + step], out=block)
+        np.logical_not(block, out=block)
+    prev_valid, next_valid = valid_positions(valid, memory_budget, spill_dir, block_budget)
+    return {
+        'tickers': np.asarray(panel.columns),
+        'dates': dates,
+        'values': values,
+        'valid': valid,
+        'prev_valid': prev_valid,
+        'next_valid': next_valid,
+    }
+
+
+def compute_snapshots(panel, signs, as_of_dates, horizons=()):
+    # Tabelas de compute_performance para várias datas de referência a partir de
+    # um único painel: as posições válidas são calculadas uma vez e cada data só
+    # faz buscas binárias no índice. Devolve {data de referência: DataFrame}
+    arrays = prepare_panel(panel)
+    return {as_of: snapshot_performance(arrays, signs, pd.Timestamp(as_of).normalize(), horizons)
+            for as_of in as_of_dates}
+
+
+def snapshot_performance(arrays, signs, today, horizons=()):
+    # Performance na data `today` usando só as linhas anteriores a ela
+    tickers = arrays['tickers']
+    values = arrays['values']
+    valid = arrays['valid']
+    prev_valid = arrays['prev_valid']
+    next_valid = arrays['next_valid']
+    rows = np.searchsorted(arrays['dates'], np.datetime64(today))
+    dates = arrays['dates'][:rows]
+    signs = np.asarray(signs, dtype=np.float64)
+
+    if len(dates) == 0:
+        return pd.DataFrame(columns=OUTPUT_COLUMNS)
+
+    instrumentation.count('rows_processed', rows * values.shape[1])
+    columns = np.arange(values.shape[1])
+
+    # Último fechamento de cada ativo; precisa cair no ano corrente
+    year_start = np.datetime64(pd.Timestamp(today.year, 1, 1))
+    end_pos = prev_valid[rows - 1]
+    has_current = end_pos >= 0
+    end_pos_safe = np.where(has_current, end_pos, 0)
+    has_current &= dates[end_pos_safe] >= year_start
+
+    # Base YTD: último fechamento antes de 1º de janeiro (busca binária no índice)
+    k = np.searchsorted(dates, year_start) - 1
+    base_pos = prev_valid[k] if k >= 0 else np.full(len(columns), -1)
+    has_base = base_pos >= 0
+    base_pos_safe = np.where(has_base, base_pos, 0)
+
+    # Preços colhidos em float64 mesmo com o painel em float32, para que as
+    # diferenças não percam precisão
+    end_price = values[end_pos_safe, columns].astype(np.float64, copy=False)
+    start_price = values[base_pos_safe, columns].astype(np.float64, copy=False)
+    ytd = signs * (end_price - start_price) / start_price * 100
+
+    # Semanal: fechamento mais próximo de 7 dias antes do último, dentro de uma
+    # janela de 10 dias antes de hoje
+    window_start = np.datetime64(today - timedelta(days=10))
+    window_row = np.searchsorted(dates, window_start)
+    window_count = valid[window_row:rows].sum(axis=0)
+
+    target = dates[end_pos_safe] - np.timedelta64(7, 'D')
+    k = np.searchsorted(dates, target)
+    before = np.where(k > 0, prev_valid[np.maximum(k - 1, 0), columns], -1)
+    # Candidatos só dentro da janela: se o alvo cai antes dela, o primeiro pregão da janela
+    after = next_valid[np.minimum(np.maximum(k, window_row), len(dates) - 1), columns]
+    before_ok = before >= window_row
+    after_ok = (after >= window_row) & (after <= end_pos_safe)
+    before_dist = np.abs(dates[np.maximum(before, 0)] - target)
+    after_dist = np.abs(dates[np.minimum(after, len(dates) - 1)] - target)
+    # Em caso de empate, fica com a data anterior
+    use_before = before_ok & (~after_ok | (before_dist <= after_dist))
+    week_pos = np.where(use_before, before, np.minimum(after, len(dates) - 1))
+
+    week_start_price = values[week_pos, columns].astype(np.float64, copy=False)
+    weekly = signs * (end_price - week_start_price) / week_start_price * 100
+
+    has_week = (window_count > 1) & (before_ok | after_ok)
+    for ticker in tickers[has_current & has_base & ~has_week]:
+        instrumentation.warning(f"Sem dados semanais para {ticker}")
+    weekly = np.where(has_week, weekly, np.nan)
+
+    extra = {}
+    for horizon in horizons:
+        base, end = horizon_positions(horizon, dates, prev_valid, end_pos, columns)
+        ok = (base >= 0) & (end >= 0) & (base < end)
+        base_price = values[np.maximum(base, 0), columns].astype(np.float64, copy=False)
+        final_price = values[np.maximum(end, 0), columns].astype(np.float64, copy=False)
+        returns = signs * (final_price - base_price) / base_price * 100
+        extra[horizon_column(horizon)] = np.where(ok, returns, np.nan)
+
+    keep = has_current & has_base
+    for ticker in tickers[~keep]:
+        instrumentation.warning(f"{ticker} sem cotação atual ou base YTD; fora da tabela")
+    result = pd.DataFrame({
+        'Moeda': tickers,
+        'Base Date': pd.DatetimeIndex(dates[base_pos_safe]).strftime('%Y-%m-%d'),
+        'Current Date': pd.DatetimeIndex(dates[end_pos_safe]).strftime('%Y-%m-%d'),
+        'Preço Base (XXX/USD)': start_price,
+        'Preço Atual (XXX/USD)': end_price,
+        'Performance YTD (%)': ytd,
+        'Performance Semanal (%)': weekly,
+        **extra,
+    })
+    return result[keep].reset_index(drop=True)
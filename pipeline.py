@@ -0,0 +1,211 @@
+import argparse
+import os
+from datetime import datetime
+
+import instrumentation
+from currency_data import (add_base_argument, add_data_arguments, add_output_arguments, data_options,
+                           fetch_panel, output_formats, panel_for_base, parse_bases, parse_horizons,
+                           performance_for_base, save_outputs)
+
+# Arquivo padrão do relatório final
+DEFAULT_REPORT_PATH = 'combined_market_report.pdf'
+
+# Moeda das cotações originais, cujo relatório mantém o nome sem sufixo
+DEFAULT_BASE = 'USD'
+
+
+def base_suffix(base):
+    # Sufixo dos arquivos de uma moeda base: '' para o dólar, '_EUR' para o euro...
+    return '' if base == DEFAULT_BASE else f'_{base}'
+
+
+def base_report_path(report_path, base):
+    # combined_market_report.pdf -> combined_market_report_EUR.pdf
+    root, ext = os.path.splitext(report_path)
+    return f'{root}{base_suffix(base)}{ext}'
+
+
+def render_report(df_currencies, df_commodities, report_path, registry, chart_format=None,
+                  chart_dpi=None, render_workers=None, rows_per_page=None, analytics=None,
+                  output_cache=None):
+    # Gráficos e PDF de um par de tabelas (e da página de análises, se houver).
+    # Com `output_cache` um relatório com as mesmas entradas e configurações é
+    # copiado do cache, e só os gráficos que mudaram são renderizados de novo
+    # Importado aqui para que quem só precisa dos números não carregue matplotlib e reportlab
+    from render_pool import chart_key, render_charts
+    from report_generator import create_combined_pdf
+    from report_layout import page_rows
+
+    rows_per_page = page_rows(rows_per_page)
+    pdf_key = None
+    if output_cache is not None:
+        from output_cache import content_key
+        from fileutil import atomic_write
+
+        # O formato efetivo dos gráficos entra na chave pela chave de um gráfico qualquer
+        pdf_key = content_key('pdf', df_currencies, df_commodities, analytics, rows_per_page,
+                              chart_key('create_enhanced_chart', None, chart_format, chart_dpi, registry))
+        data = output_cache.get(pdf_key)
+        if data is not None:
+            atomic_write(report_path, data)
+            return
+
+    # No layout paginado os gráficos de cada página são renderizados pelo próprio PDF
+    currency_chart = commodity_chart = heatmap_chart = None
+    if max(len(df_currencies), len(df_commodities)) <= rows_per_page:
+        jobs = [
+            ('create_enhanced_chart', df_currencies, chart_format, chart_dpi, registry),
+            ('create_enhanced_commodities_chart', df_commodities, chart_format, chart_dpi, registry),
+        ]
+        if analytics is not None:
+            jobs.append(('create_correlation_heatmap', analytics[1], chart_format, chart_dpi, registry))
+        with instrumentation.span('charts'):
+            charts = render_charts(jobs, max_workers=render_workers, cache=output_cache)
+        currency_chart, commodity_chart = charts[:2]
+        heatmap_chart = charts[2] if analytics is not None else None
+    with instrumentation.span('pdf'):
+        create_combined_pdf(currency_chart, commodity_chart, df_currencies, df_commodities,
+                            output_path=report_path, registry=registry, rows_per_page=rows_per_page,
+                            chart_format=chart_format, chart_dpi=chart_dpi,
+                            analytics=analytics, heatmap_chart=heatmap_chart,
+                            output_cache=output_cache, render_workers=render_workers)
+
+    if pdf_key is not None:
+        with open(report_path, 'rb') as f:
+            output_cache.put(pdf_key, f.read())
+
+
+def run_pipeline(current_date=None, horizons=(), report_path=DEFAULT_REPORT_PATH,
+                 save_formats=None, chart_format=None, chart_dpi=None, render_workers=None,
+                 rows_per_page=None, bases=(DEFAULT_BASE,), analytics=False,
+                 analytics_window=None, output_cache=None, **data_kwargs):
+    # Executa busca, cálculo, gráficos e PDF em um único processo, passando os
+    # DataFrames em memória. As tabelas só são gravadas em disco se `save_formats`
+    # (ex.: ('arrow', 'csv')) for informado e o
+    # PDF só é gerado se `report_path` não for None. `chart_format` ('vector' ou
+    # 'png') e `chart_dpi` sobrescrevem os padrões de report_generator; os gráficos
+    # são renderizados em paralelo em até `render_workers` processos. Acima de
+    # `rows_per_page` ativos por classe o PDF é paginado. Para cada moeda de `bases`
+    # são gerados tabelas e relatório próprios, todos triangulados do mesmo painel
+    # em dólar (um único download). Com `analytics` o PDF ganha a página de
+    # volatilidade, drawdown e correlações, calculada sobre pelo menos um ano de
+    # histórico com janela de `analytics_window` pregões. `output_cache`
+    # (output_cache.OutputCache) evita renderizar de novo o que não mudou. `data_kwargs` vai para
+    # currency_data.load_price_panel (fonte, cache, concorrência...)
+    current_date = current_date or datetime.now()
+    history = list(horizons)
+    if analytics:
+        from analytics import ANALYTICS_HISTORY, DEFAULT_WINDOW, compute_analytics
+
+        history.append(ANALYTICS_HISTORY)
+    stale = set()
+    panel = fetch_panel(current_date, history, stale=stale, **data_kwargs)
+
+    results = {}
+    for base in bases:
+        df_currencies, df_commodities, registry = performance_for_base(panel, base, current_date,
+                                                                       horizons, stale)
+
+        if save_formats:
+            save_outputs(df_currencies, df_commodities, base_suffix(base), save_formats, registry)
+
+        result = {
+            'currencies': df_currencies,
+            'commodities': df_commodities,
+            'report_path': None,
+            'analytics': None,
+        }
+
+        if analytics:
+            base_panel, _ = panel_for_base(panel, base)
+            with instrumentation.span('analytics', base=base):
+                result['analytics'] = compute_analytics(base_panel.reindex(columns=list(registry.tickers())),
+                                                        registry.signs(), current_date,
+                                                        analytics_window or DEFAULT_WINDOW)
+
+        if report_path is not None:
+            path = base_report_path(report_path, base)
+            with instrumentation.span('report', base=base):
+                render_report(df_currencies, df_commodities, path, registry, chart_format,
+                              chart_dpi, render_workers, rows_per_page, result['analytics'],
+                              output_cache)
+            result['report_path'] = path
+        results[base] = result
+
+    # A primeira base continua no nível de cima, como antes; as demais ficam em 'bases'.
+    # 'stale' lista os tickers servidos do cache por não terem chegado no prazo
+    return {**results[bases[0]], 'bases': results, 'stale': sorted(stale)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Gera o relatório de moedas e commodities em um único passo')
+    add_data_arguments(parser)
+    add_base_argument(parser)
+    parser.add_argument('--output', default=DEFAULT_REPORT_PATH, help='caminho do PDF gerado')
+    parser.add_argument('--no-pdf', action='store_true', help='só calcula os números, sem gerar o PDF')
+    parser.add_argument('--chart-format', choices=['vector', 'png'],
+                        help='gráficos vetoriais (padrão) ou rasterizados')
+    parser.add_argument('--dpi', type=int, help='resolução dos gráficos rasterizados')
+    parser.add_argument('--render-workers', type=int,
+                        help='processos usados para renderizar os gráficos (padrão: núcleos disponíveis)')
+    parser.add_argument('--trace', metavar='ARQUIVO',
+                        help='grava tempos por etapa e contadores em JSON (ou OpenMetrics, se terminar em .prom)')
+    parser.add_argument('--profile', metavar='ARQUIVO',
+                        help=f'roda sob cProfile e grava as estatísticas (também via {instrumentation.PROFILE_ENV})')
+    parser.add_argument('--rows-per-page', type=int,
+                        help='máximo de ativos por página antes de paginar o relatório')
+    parser.add_argument('--save', action='store_true',
+                        help='grava as tabelas e os registros de ativos (Arrow por padrão; veja --format)')
+    add_output_arguments(parser)
+    parser.add_argument('--analytics', action='store_true',
+                        help='adiciona a página de volatilidade, drawdown e correlações')
+    parser.add_argument('--analytics-window', type=int,
+                        help='pregões da janela de volatilidade e z-score (padrão: 21)')
+    parser.add_argument('--output-cache', default=None,
+                        help='diretório do cache de gráficos e relatórios (padrão: .report_cache)')
+    parser.add_argument('--output-cache-mb', type=float,
+                        help='tamanho máximo do cache de gráficos e relatórios, em MiB (padrão: 256)')
+    parser.add_argument('--no-output-cache', action='store_true',
+                        help='renderiza tudo de novo, sem ler nem gravar o cache de saídas')
+    args = parser.parse_args(argv)
+
+    output_cache = None
+    if not args.no_output_cache and not args.no_pdf:
+        from output_cache import DEFAULT_MAX_BYTES, DEFAULT_OUTPUT_CACHE, OutputCache
+
+        max_bytes = int(args.output_cache_mb * 2 ** 20) if args.output_cache_mb else DEFAULT_MAX_BYTES
+        output_cache = OutputCache(args.output_cache or DEFAULT_OUTPUT_CACHE, max_bytes)
+
+    with instrumentation.profiled(args.profile), instrumentation.span('pipeline'):
+        result = run_pipeline(horizons=parse_horizons(args.horizons),
+                              report_path=None if args.no_pdf else args.output,
+                              save_formats=output_formats(args) if args.save or args.csv else None,
+                              chart_format=args.chart_format,
+                              chart_dpi=args.dpi,
+                              render_workers=args.render_workers,
+                              rows_per_page=args.rows_per_page,
+                              bases=parse_bases(args.base),
+                              analytics=args.analytics,
+                              analytics_window=args.analytics_window,
+                              output_cache=output_cache,
+                              **data_options(args))
+
+    if args.trace:
+        instrumentation.write_trace(args.trace)
+
+    for base, base_result in result['bases'].items():
+        if base_result['report_path'] is None:
+            print(f"Base {base}")
+            print(base_result['currencies'].to_string(index=False))
+            print()
+            print(base_result['commodities'].to_string(index=False))
+            print()
+            if base_result['analytics'] is not None:
+                print(base_result['analytics'][0].to_string(index=False))
+                print()
+        else:
+            print(f"✅ Relatório gerado em {base_result['report_path']}")
+
+
+if __name__ == "__main__":
+    main()
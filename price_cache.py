@@ -0,0 +1,188 @@
+import sqlite3
+from datetime import date, timedelta
+
+import pandas as pd
+
+import instrumentation
+
+# Arquivo padrão do cache local de fechamentos
+DEFAULT_CACHE_PATH = 'price_cache.sqlite'
+
+
+class PriceCache:
+    # Armazena fechamentos diários por ticker em SQLite, junto com o intervalo de
+    # datas já coberto e o dia da última atualização de cada ticker
+
+    def __init__(self, path=DEFAULT_CACHE_PATH):
+        self.path = path
+        # Espera pelo lock de escrita em vez de falhar: shards em processos
+        # paralelos gravam no mesmo arquivo
+        self.conn = sqlite3.connect(path, timeout=60)
+        self.conn.executescript('''
+            CREATE TABLE IF NOT EXISTS prices (
+                ticker TEXT NOT NULL,
+                date TEXT NOT NULL,
+                close REAL,
+                PRIMARY KEY (ticker, date)
+            );
+            CREATE TABLE IF NOT EXISTS coverage (
+                ticker TEXT PRIMARY KEY,
+                first_date TEXT NOT NULL,
+                last_date TEXT NOT NULL,
+                fetched_on TEXT NOT NULL
+            );
+        ''')
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def coverage(self, tickers=None):
+        # Devolve {ticker: (primeira data, última data, dia da última busca)}
+        rows = self.conn.execute('SELECT ticker, first_date, last_date, fetched_on FROM coverage').fetchall()
+        result = {
+            ticker: (pd.Timestamp(first), pd.Timestamp(last), pd.Timestamp(fetched))
+            for ticker, first, last, fetched in rows
+        }
+        if tickers is not None:
+            result = {t: result[t] for t in tickers if t in result}
+        return result
+
+    def _query(self, columns, tickers, start=None, end=None):
+        # Consulta SQL dos fechamentos de `tickers` na janela [start, end)
+        query = f'SELECT {columns} FROM prices WHERE ticker IN (%s)' % ','.join('?' * len(tickers))
+        params = list(tickers)
+        if start is not None:
+            query += ' AND date >= ?'
+            params.append(pd.Timestamp(start).strftime('%Y-%m-%d'))
+        if end is not None:
+            query += ' AND date < ?'
+            params.append(pd.Timestamp(end).strftime('%Y-%m-%d'))
+        return query, params
+
+    def rows(self, tickers, start=None, end=None):
+        # Fechamentos em formato longo (ticker, date, close), sem pivotar
+        query, params = self._query('ticker, date, close', list(tickers), start, end)
+        return pd.read_sql_query(query, self.conn, params=params)
+
+    def dates(self, tickers, start=None, end=None):
+        # Datas com algum fechamento de `tickers` na janela, em ordem
+        query, params = self._query('DISTINCT date', list(tickers), start, end)
+        return [pd.Timestamp(d) for d, in self.conn.execute(query + ' ORDER BY date', params)]
+
+    def load(self, tickers, start=None, end=None):
+        # Monta o painel data x ticker a partir do cache, na janela [start, end)
+        tickers = list(tickers)
+        rows = self.rows(tickers, start, end)
+        if rows.empty:
+            return pd.DataFrame(columns=tickers, dtype=float)
+
+        rows['date'] = pd.to_datetime(rows['date'])
+        panel = rows.pivot(index='date', columns='ticker', values='close')
+        panel.index.name = None
+        panel.columns.name = None
+        return panel.reindex(columns=tickers).sort_index()
+
+    def append(self, panel, fetched_on=None):
+        # Grava (ou sobrescreve) os fechamentos do painel e atualiza a cobertura
+        fetched_on = (fetched_on or date.today()).strftime('%Y-%m-%d')
+        with self.conn:
+            for ticker in panel.columns:
+                closes = panel[ticker].dropna()
+                if closes.empty:
+                    continue
+                dates = closes.index.strftime('%Y-%m-%d')
+                self.conn.executemany(
+                    'INSERT OR REPLACE INTO prices (ticker, date, close) VALUES (?, ?, ?)',
+                    zip([ticker] * len(closes), dates, closes.astype(float)),
+                )
+                self.conn.execute('''
+                    INSERT INTO coverage (ticker, first_date, last_date, fetched_on) VALUES (?, ?, ?, ?)
+                    ON CONFLICT(ticker) DO UPDATE SET
+                        first_date = MIN(first_date, excluded.first_date),
+                        last_date = MAX(last_date, excluded.last_date),
+                        fetched_on = excluded.fetched_on
+                ''', (ticker, dates[0], dates[-1], fetched_on))
+
+    def invalidate(self, tickers=None):
+        # Remove todo o histórico dos tickers informados (ou do cache inteiro)
+        with self.conn:
+            if tickers is None:
+                self.conn.execute('DELETE FROM prices')
+                self.conn.execute('DELETE FROM coverage')
+                return
+            for ticker in tickers:
+                self.conn.execute('DELETE FROM prices WHERE ticker = ?', (ticker,))
+                self.conn.execute('DELETE FROM coverage WHERE ticker = ?', (ticker,))
+
+    def evict(self, before=None, keep_tickers=None):
+        # Descarta fechamentos anteriores a `before` e tickers fora de `keep_tickers`
+        with self.conn:
+            if keep_tickers is not None:
+                keep = list(keep_tickers)
+                placeholders = ','.join('?' * len(keep))
+                self.conn.execute('DELETE FROM prices WHERE ticker NOT IN (%s)' % placeholders, keep)
+                self.conn.execute('DELETE FROM coverage WHERE ticker NOT IN (%s)' % placeholders, keep)
+            if before is not None:
+                cutoff = pd.Timestamp(before).strftime('%Y-%m-%d')
+                self.conn.execute('DELETE FROM prices WHERE date < ?', (cutoff,))
+                # Recalcula a cobertura a partir do que sobrou
+                self.conn.execute('''
+                    UPDATE coverage SET first_date = (
+                        SELECT MIN(date) FROM prices WHERE prices.ticker = coverage.ticker
+                    )
+                ''')
+                self.conn.execute('DELETE FROM coverage WHERE first_date IS NULL')
+
+
+def empty_tickers(panel, tickers):
+    # Tickers sem nenhum fechamento no painel
+    return [t for t in tickers if t not in panel.columns or panel[t].isna().all()]
+
+
+def update_cache(cache, fetch, tickers, start, end, today=None, stale=None):
+    # Busca apenas o que falta no cache: o histórico completo para tickers novos
+    # (ou cobertos só a partir de uma data posterior a `start`) e só o final da
+    # série para os demais. `fetch(tickers, start, end)` devolve um painel data x ticker.
+    # Tickers que precisavam de atualização e voltaram vazios (erro ou prazo
+    # estourado) são servidos com o que já está no cache e entram no conjunto `stale`
+    today = pd.Timestamp(today or date.today())
+    start = pd.Timestamp(start)
+    coverage = cache.coverage(tickers)
+
+    missing = []
+    outdated = {}
+    for ticker in tickers:
+        if ticker not in coverage or coverage[ticker][0] > start + timedelta(days=7):
+            missing.append(ticker)
+        elif coverage[ticker][2] < today:
+            outdated[ticker] = coverage[ticker][1]
+
+    instrumentation.count('cache_hits', len(tickers) - len(missing) - len(outdated))
+    instrumentation.count('cache_misses', len(missing))
+    instrumentation.count('cache_tail_updates', len(outdated))
+
+    failed = set()
+    if missing:
+        fetched = fetch(missing, start, end)
+        failed.update(empty_tickers(fetched, missing))
+        cache.append(fetched)
+
+    if outdated:
+        # Refaz o último dia coberto, que pode ter sido gravado com preço parcial
+        tail_start = min(outdated.values())
+        fetched = fetch(list(outdated), tail_start, end)
+        failed.update(empty_tickers(fetched, outdated))
+        cache.append(fetched)
+
+    if failed:
+        instrumentation.count('stale_tickers', len(failed))
+        if stale is not None:
+            stale.update(failed)
+
+    return cache.load(tickers, start=start, end=end)
@@ -0,0 +1,150 @@
+import os
+import zlib
+
+import numpy as np
+import pandas as pd
+
+import instrumentation
+
+# Data de origem das séries sintéticas; tudo é gerado a partir dela para que
+# buscas com janelas diferentes devolvam os mesmos preços
+SYNTHETIC_ORIGIN = pd.Timestamp('2000-01-03')
+
+
+class PriceSource:
+    # Interface comum das fontes de preço: `fetch` devolve um painel de
+    # fechamentos data x ticker na janela [start, end), com NaN onde não há cotação
+
+    def fetch(self, tickers, start, end):
+        raise NotImplementedError
+
+    def __call__(self, tickers, start, end):
+        return self.fetch(tickers, start, end)
+
+
+class YFinanceSource(PriceSource):
+    # Busca os fechamentos no Yahoo Finance em uma única requisição por chamada
+
+    def fetch(self, tickers, start, end):
+        import yfinance as yf
+
+        tickers = list(tickers)
+        with instrumentation.span('download', tickers=len(tickers)):
+            data = yf.download(tickers, start=start, end=end, group_by='column', progress=False)
+        # O yfinance não expõe o tamanho da resposta; conta o tamanho dos dados recebidos
+        instrumentation.count('network_calls')
+        instrumentation.count('bytes_downloaded', int(data.memory_usage(deep=True).sum()))
+
+        if data.empty:
+            return pd.DataFrame(columns=tickers, dtype=float)
+
+        closes = data['Close']
+        # Versões antigas do yfinance devolvem uma Series quando há um único ticker
+        if isinstance(closes, pd.Series):
+            closes = closes.to_frame(name=tickers[0])
+
+        return closes.reindex(columns=tickers).sort_index()
+
+
+class LocalSource(PriceSource):
+    # Reproduz fixtures gravadas em disco. `path` pode ser um arquivo CSV/Parquet
+    # largo (índice de datas, uma coluna por ticker) ou um diretório com um
+    # arquivo por ticker (`<ticker>.csv` ou `<ticker>.parquet`, colunas Date e Close)
+
+    def __init__(self, path):
+        self.path = path
+        self._panel = None
+
+    def _read(self, path):
+        if path.endswith('.parquet'):
+            return pd.read_parquet(path)
+        return pd.read_csv(path, index_col=0, parse_dates=True)
+
+    def _ticker_file(self, ticker):
+        for ext in ('.parquet', '.csv'):
+            candidate = os.path.join(self.path, ticker + ext)
+            if os.path.exists(candidate):
+                return candidate
+        return None
+
+    def _load_ticker(self, ticker):
+        path = self._ticker_file(ticker)
+        if path is None:
+            return pd.Series(dtype=float, name=ticker)
+        frame = self._read(path)
+        closes = frame['Close'] if 'Close' in frame.columns else frame.iloc[:, 0]
+        return closes.rename(ticker)
+
+    def fetch(self, tickers, start, end):
+        tickers = list(tickers)
+        if os.path.isdir(self.path):
+            series = [self._load_ticker(ticker) for ticker in tickers]
+            panel = pd.concat(series, axis=1) if series else pd.DataFrame()
+        else:
+            # Arquivo largo: lido uma única vez e mantido em memória
+            if self._panel is None:
+                self._panel = self._read(self.path)
+            panel = self._panel
+
+        panel = panel.reindex(columns=tickers).sort_index()
+        panel.index = pd.DatetimeIndex(panel.index)
+        mask = (panel.index >= pd.Timestamp(start)) & (panel.index < pd.Timestamp(end))
+        return panel[mask]
+
+    @staticmethod
+    def save(panel, path):
+        # Grava um painel no formato lido por LocalSource (arquivo largo)
+        if path.endswith('.parquet'):
+            panel.to_parquet(path)
+        else:
+            panel.to_csv(path)
+
+
+class SyntheticSource(PriceSource):
+    # Gera passeios aleatórios determinísticos por ticker: o mesmo ticker sempre
+    # produz a mesma série, qualquer que seja a janela pedida
+
+    def __init__(self, seed=0, volatility=0.01):
+        self.seed = seed
+        self.volatility = volatility
+
+    def fetch(self, tickers, start, end):
+        tickers = list(tickers)
+        dates = pd.bdate_range(SYNTHETIC_ORIGIN, pd.Timestamp(end) - pd.Timedelta(days=1))
+        columns = {}
+        for ticker in tickers:
+            rng = np.random.default_rng([self.seed, zlib.crc32(ticker.encode())])
+            start_price = rng.uniform(1, 1000)
+            returns = rng.normal(0, self.volatility, len(dates))
+            columns[ticker] = start_price * np.exp(np.cumsum(returns))
+
+        panel = pd.DataFrame(columns, index=dates, columns=tickers)
+        return panel[panel.index >= pd.Timestamp(start)]
+
+
+def synthetic_panel(n_tickers, n_days, end=None, seed=0, volatility=0.01, dtype=np.float64):
+    # Painel sintético de qualquer tamanho, gerado de uma vez (para benchmarks e testes
+    # de carga); os tickers são nomeados SYN00000, SYN00001, ...
+    end = pd.Timestamp(end or pd.Timestamp.today().normalize())
+    dates = pd.bdate_range(end=end, periods=n_days)
+    rng = np.random.default_rng(seed)
+    start_prices = rng.uniform(1, 1000, n_tickers)
+    returns = rng.normal(0, volatility, (n_days, n_tickers))
+    values = (start_prices * np.exp(np.cumsum(returns, axis=0))).astype(dtype)
+    tickers = [f'SYN{i:05d}' for i in range(n_tickers)]
+    return pd.DataFrame(values, index=dates, columns=tickers)
+
+
+def get_source(spec):
+    # Constrói a fonte a partir de uma especificação de linha de comando:
+    # 'yfinance', 'local:<caminho>' ou 'synthetic[:<semente>]'
+    kind, _, arg = spec.partition(':')
+    if kind == 'yfinance':
+        return YFinanceSource()
+    if kind == 'local':
+        if not arg:
+            raise ValueError("Fonte local precisa de um caminho: 'local:<caminho>'")
+        return LocalSource(arg)
+    if kind == 'synthetic':
+        return SyntheticSource(seed=int(arg) if arg else 0)
+    raise ValueError(f"Fonte de preços desconhecida: {spec}")
@@ -0,0 +1,60 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+
+def _init_worker():
+    # Cada processo renderiza sem interface gráfica
+    import matplotlib
+    matplotlib.use('Agg')
+
+
+def _render_chart(builder, df, fmt, dpi, registry=None):
+    # Executa no processo filho: monta o gráfico e devolve os bytes (SVG ou PNG)
+    import report_generator
+
+    registry = registry or report_generator.REGISTRY
+    return getattr(report_generator, builder)(df, fmt, dpi, registry).getvalue()
+
+
+def chart_key(builder, df, fmt, dpi, registry=None):
+    # Chave de conteúdo de um gráfico, com formato e dpi já resolvidos para os
+    # padrões de report_generator (inclusive a troca para PNG sem svglib)
+    import report_generator
+    from output_cache import content_key
+
+    fmt = fmt or report_generator.CHART_FORMAT
+    if fmt == 'vector' and not report_generator.vector_charts_available():
+        fmt = 'png'
+    dpi = None if fmt == 'vector' else dpi or report_generator.CHART_DPI
+    return content_key('chart', builder, df, fmt, dpi, registry or report_generator.REGISTRY)
+
+
+def _render_all(jobs, max_workers):
+    workers = min(max_workers or os.cpu_count() or 1, len(jobs))
+
+    if workers <= 1:
+        _init_worker()
+        return [_render_chart(*job) for job in jobs]
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        return list(pool.map(_render_chart, *zip(*jobs)))
+
+
+def render_charts(jobs, max_workers=None, cache=None):
+    # Renderiza vários gráficos em paralelo, um por processo. Cada job é uma tupla
+    # (nome da função em report_generator, DataFrame ou None, formato, dpi[, registro]);
+    # os buffers são devolvidos na mesma ordem dos jobs, prontos para o PDF. Com
+    # `cache` (output_cache.OutputCache) só os gráficos cujo conteúdo mudou são
+    # renderizados; jobs sem DataFrame (lidos do CSV) nunca usam o cache
+    jobs = [tuple(job) + (None,) * (5 - len(job)) for job in jobs]
+    keys = [chart_key(*job) if cache is not None and job[1] is not None else None for job in jobs]
+    results = [cache.get(key) if key else None for key in keys]
+
+    missing = [i for i, data in enumerate(results) if data is None]
+    if missing:
+        for i, data in zip(missing, _render_all([jobs[i] for i in missing], max_workers)):
+            results[i] = data
+            if keys[i]:
+                cache.put(keys[i], data)
+    return [BytesIO(data) for data in results]
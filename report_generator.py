@@ -1,460 +1,318 @@
-import pandas as pd
-import matplotlib.pyplot as plt
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import landscape, A4
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image, Table, TableStyle, Flowable, Frame, PageBreak
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
 from io import BytesIO
-import os
 
-# Carregar dados das moedas e commodities globalmente
-currencies = pd.read_csv('currencies_info.csv').set_index('Unnamed: 0').to_dict('index')
-commodities = pd.read_csv('commodities_info.csv').set_index('Unnamed: 0').to_dict('index')
+import instrumentation
+from assets import REGISTRY
+
+# pandas, matplotlib e reportlab são importados dentro das funções que os usam:
+# importar este módulo é rápido e não lê nenhum arquivo
+
+# Formato padrão dos gráficos: 'vector' (SVG convertido em desenho do reportlab,
+# requer svglib) ou 'png' (imagem rasterizada com CHART_DPI pontos por polegada)
+CHART_FORMAT = 'vector'
+CHART_DPI = 300
+
+# Parâmetros do matplotlib de todos os gráficos do relatório, definidos uma vez
+CHART_STYLE = {
+    'figure.dpi': 300,
+    'font.size': 11,
+    'font.family': 'Arial',
+}
+
+# Limites da página de análises: nomes nos eixos do mapa de calor e linhas da tabela
+HEATMAP_MAX_LABELS = 60
+ANALYTICS_TABLE_ROWS = 28
+
+# Verifica se o svglib está disponível para embutir gráficos vetoriais
+def vector_charts_available():
+    try:
+        import svglib.svglib  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+# Salva a figura atual em memória, em SVG ou PNG, e fecha a figura
+def save_chart(fmt=None, dpi=None):
+    fmt = fmt or CHART_FORMAT
+    dpi = dpi or CHART_DPI
+    if fmt == 'vector' and not vector_charts_available():
+        instrumentation.warning("svglib não instalado; usando gráfico rasterizado")
+        fmt = 'png'
+
+    import matplotlib.pyplot as plt
 
-def create_enhanced_chart():
-    # Carregar os dados
-    df = pd.read_csv('currency_data.csv')
-    
-    # Ordenar por performance semanal para o segundo gráfico
-    df_weekly = df.copy()
-    df_weekly = df_weekly.sort_values(by='Performance Semanal (%)', ascending=True)
-    df = df.sort_values(by='Performance YTD (%)', ascending=True)
-
-    # Criar um dicionário reverso para mapear tickers para nomes
-    ticker_to_name = {}
-    for currency, info in currencies.items():
-        ticker_to_name[info['ticker']] = info['name']
-        if currency == 'DXY':
-            ticker_to_name['DXY'] = 'Índice do Dólar (DXY)'
-    
-    # Debug pra ver que porra tá vindo
-    print("Moedas no DataFrame:", df['Moeda'].tolist())
-    print("\nTicker to name dict:", ticker_to_name)
-
-    # Configurações do gráfico
-    plt.rcParams['figure.dpi'] = 300
-    plt.rcParams['font.size'] = 11
-    plt.rcParams['font.family'] = 'Arial'
-
-    # Criar dois subplots empilhados com tamanho menor
-    fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(9, 10))
-
-    # Configurar ambos os gráficos
-    for ax in [ax1, ax2]:
-        ax.spines['top'].set_visible(True)
-        ax.spines['right'].set_visible(True)
-        ax.spines['bottom'].set_visible(True)
-        ax.spines['left'].set_visible(True)
-        for spine in ax.spines.values():
-            spine.set_linewidth(1.5)
-
-    # Gráfico YTD (mantém a ordem YTD)
-    moedas_ytd = []
-    for moeda in df['Moeda']:
-        try:
-            if moeda == 'DX-Y.NYB' or moeda == 'DXY':
-                moedas_ytd.append('Índice do Dólar (DXY)')
-            else:
-                moedas_ytd.append(ticker_to_name[moeda])
-        except KeyError as e:
-            print(f"Erro na moeda: {moeda}")
-            print(f"Dicionário disponível: {ticker_to_name}")
-            raise e
-
-    performance_ytd = df['Performance YTD (%)'].values
-    bars1 = ax1.barh(moedas_ytd, performance_ytd, 
-                     color=['#2E7D32' if x > 0 else '#F44336' for x in performance_ytd])
-    ax1.set_title('Performance YTD', fontsize=14, fontweight='bold')
-    
-    # Gráfico Semanal (usa a ordem semanal)
-    moedas_weekly = []
-    for moeda in df_weekly['Moeda']:
-        try:
-            if moeda == 'DX-Y.NYB' or moeda == 'DXY':
-                moedas_weekly.append('Índice do Dólar (DXY)')
-            else:
-                moedas_weekly.append(ticker_to_name[moeda])
-        except KeyError as e:
-            print(f"Erro na moeda: {moeda}")
-            print(f"Dicionário disponível: {ticker_to_name}")
-            raise e
-
-    performance_week = df_weekly['Performance Semanal (%)'].values
-    bars2 = ax2.barh(moedas_weekly, performance_week,
-                     color=['#2E7D32' if x > 0 else '#F44336' for x in performance_week])
-    ax2.set_title('Performance Semanal', fontsize=14, fontweight='bold')
-
-    # Adicionar valores nas barras para ambos os gráficos
-    for ax, bars, performance in [(ax1, bars1, performance_ytd), (ax2, bars2, performance_week)]:
-        max_value = max(abs(performance.min()), abs(performance.max()))
-        ax.set_xlim(-(max_value + 0.5), max_value + 0.5)
-        
-        for bar in bars:
-            width = bar.get_width()
-            offset = 0.05 * max_value
-            ax.text(width + (offset if width > 0 else -offset), 
-                    bar.get_y() + bar.get_height()/2,
-                    f"{width:+.2f}%", 
-                    va='center', 
-                    ha='left' if width > 0 else 'right',
-                    fontsize=10)
-        
-        ax.grid(axis='x', linestyle='--', alpha=0.5)
-        ax.set_xlabel('Performance (%)', fontsize=12)
-
-    plt.tight_layout()
-    
     buffer = BytesIO()
-    plt.savefig(buffer, format='png', dpi=300, bbox_inches='tight')
+    if fmt == 'vector':
+        plt.savefig(buffer, format='svg', bbox_inches='tight')
+    else:
+        plt.savefig(buffer, format='png', dpi=dpi, bbox_inches='tight')
     plt.close()
     buffer.seek(0)
     return buffer
 
-def create_enhanced_pdf(chart_image):
-    # Proporção de slide (16:9)
-    slide_width = 16 * inch
-    slide_height = 9 * inch
-
-    doc = SimpleDocTemplate("enhanced_currency_report.pdf",
-                          pagesize=(slide_width, slide_height),
-                          rightMargin=30,
-                          leftMargin=30,
-                          topMargin=30,
-                          bottomMargin=30)
-
-    story = []
-    elements = []
-    
-    img = Image(chart_image, width=6 * inch, height=7 * inch)
-    
-    df = pd.read_csv('currency_data.csv')
-    df = df.rename(columns={
-        'Performance YTD (%)': 'YTD',
-        'Performance Semanal (%)': 'Δ Semana'
-    })
-
-    # Criar um dicionário reverso para mapear tickers para nomes
-    ticker_to_name = {}
-    for currency, info in currencies.items():
-        ticker_to_name[info['ticker']] = info['name']
-        # Adiciona o DXY especificamente
-        if currency == 'DXY':
-            ticker_to_name['DXY'] = 'Índice do Dólar (DXY)'
-    
-    # Debug pra ver que porra tá vindo
-    print("\nMoedas na tabela:", df['Moeda'].tolist())
-    print("Dicionário disponível:", ticker_to_name)
-    
-    table_data = [['Moeda', 'YTD', 'Δ Semana']]
-    for i, row in df.iterrows():
-        try:
-            if row['Moeda'] == 'DX-Y.NYB' or row['Moeda'] == 'DXY':
-                name = 'Índice do Dólar (DXY)'
-            else:
-                name = ticker_to_name[row['Moeda']]
-            
-            table_data.append([
-                name,
-                f"{row['YTD']:+.2f}%",
-                f"{row['Δ Semana']:+.2f}%"
-            ])
-        except KeyError as e:
-            print(f"Erro na moeda: {row['Moeda']}")
-            print(f"Dicionário disponível: {ticker_to_name}")
-            raise e
-
-    # Tabela com larguras menores
-    table = Table(table_data, colWidths=[160, 80, 80])
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#2E7D32')),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 6),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.white),
-        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-        ('FONTSIZE', (0, 0), (-1, -1), 9),
-        ('ALIGN', (1, 1), (-1, -1), 'RIGHT'),
-        ('ALIGN', (0, 0), (0, -1), 'LEFT'),
-    ]))
-
-    # Layout table com larguras menores
-    layout_table = Table([[img, table]], colWidths=[7.5*inch, 6*inch])
-    layout_table.setStyle(TableStyle([
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-    ]))
-
-    story.append(layout_table)
-    doc.build(story)
-
-def create_enhanced_commodities_chart():
-    # Carregar os dados
-    df = pd.read_csv('commodity_data.csv')
-    
+# Converte o gráfico em memória (SVG ou PNG) em um flowable do reportlab com o tamanho pedido
+def chart_flowable(chart, width, height):
+    from reportlab.platypus import Image
+
+    if isinstance(chart, BytesIO):
+        header = chart.getvalue()[:256].lstrip()
+        if header.startswith(b'<?xml') or header.startswith(b'<svg'):
+            from svglib.svglib import svg2rlg
+
+            chart.seek(0)
+            drawing = svg2rlg(chart)
+            drawing.scale(width / drawing.width, height / drawing.height)
+            drawing.width = width
+            drawing.height = height
+            return drawing
+        chart.seek(0)
+    return Image(chart, width=width, height=height)
+
+# Usa a tabela recebida em memória ou, na falta dela, lê a saída gravada por
+# currency_data.py (Arrow ou Parquet, mapeados em memória, ou o CSV legado)
+def load_table(df, path):
+    import os
+
+    from outputs import read_output
+
+    return read_output(os.path.splitext(path)[0]) if df is None else df
+
+# Colunas de horizontes extras (além de YTD e semanal) geradas por currency_data.py
+def extra_horizon_columns(df):
+    return [col for col in df.columns
+            if col.startswith('Performance ') and col.endswith(' (%)')
+            and col not in ('Performance YTD (%)', 'Performance Semanal (%)')]
+
+# Cabeçalho curto de uma coluna de horizonte ('Performance 3M (%)' -> '3M'). Os
+# intervalos personalizados viram datas curtas em duas linhas, para caber na coluna
+# ('2024-06-01:2024-09-30' -> '01/06/24' / '30/09/24'; '2024-06-01' -> 'desde' / '01/06/24')
+def horizon_label(column):
+    import re
+
+    horizon = column[len('Performance '):-len(' (%)')]
+    dates = re.fullmatch(r'(\d{4})-(\d{2})-(\d{2})(?::(\d{4})-(\d{2})-(\d{2}))?', horizon)
+    if dates is None:
+        return horizon
+    y1, m1, d1, y2, m2, d2 = dates.groups()
+    start = f'{d1}/{m1}/{y1[2:]}'
+    return f'{start}\n{d2}/{m2}/{y2[2:]}' if y2 else f'desde\n{start}'
+
+# Formata uma coluna inteira de retornos em %, com '-' onde não há dado. A
+# formatação é feita de uma vez sobre o array, sem laço por linha
+def format_returns(values, template='%+.2f%%'):
+    import numpy as np
+
+    values = np.asarray(values, dtype=float)
+    if not len(values):
+        return np.array([], dtype=object)
+    return np.where(np.isnan(values), '-', np.char.mod(template, values)).astype(object)
+
+# Nomes exibidos na tabela; ativos servidos do cache levam a data do último fechamento
+def table_names(names, df):
+    import numpy as np
+    import pandas as pd
+
+    names = np.asarray(names, dtype=object)
+    if 'Stale' not in df.columns or not len(names):
+        return names
+    suffix = ' (até ' + pd.to_datetime(df['Current Date']).dt.strftime('%d/%m').to_numpy(dtype=object) + ')'
+    return np.where(df['Stale'].to_numpy(dtype=bool), names + suffix, names)
+
+# Monta as linhas da tabela de performance (cabeçalho + uma linha por ativo) a
+# partir da tabela já renomeada para 'YTD' e 'Δ Semana'. Cada coluna é formatada
+# inteira e as linhas saem da junção das colunas
+def performance_table_data(df, header, registry=REGISTRY):
+    extra_columns = extra_horizon_columns(df)
+    columns = [table_names(registry.display_names(df['Moeda']), df),
+               format_returns(df['YTD']),
+               format_returns(df['Δ Semana'])]
+    columns += [format_returns(df[col]) for col in extra_columns]
+    table_data = [[header, 'YTD', 'Δ Semana'] + [horizon_label(col) for col in extra_columns]]
+    table_data += [list(row) for row in zip(*columns)]
+    return table_data, extra_columns
+
+# Estilo do matplotlib aplicado só durante a montagem de um gráfico, sem mexer
+# em plt.rcParams globalmente
+def chart_style():
+    import matplotlib.pyplot as plt
+
+    return plt.rc_context(CHART_STYLE)
+
+# Gráfico de barras YTD e semanal, compartilhado por moedas e commodities
+def performance_chart(df, fmt=None, dpi=None, registry=REGISTRY):
+    import numpy as np
+    import matplotlib.pyplot as plt
+
     # Ordenar por performance semanal para o segundo gráfico
-    df_weekly = df.copy()
+    df_weekly = df.dropna(subset=['Performance Semanal (%)'])
     df_weekly = df_weekly.sort_values(by='Performance Semanal (%)', ascending=True)
     df = df.sort_values(by='Performance YTD (%)', ascending=True)
 
-    # Criar um dicionário reverso para mapear tickers para nomes
-    ticker_to_name = {}
-    for commodity, info in commodities.items():
-        ticker_to_name[info['ticker']] = info['name']
-
-    # Configurações do gráfico
-    plt.rcParams['figure.dpi'] = 300
-    plt.rcParams['font.size'] = 11
-    plt.rcParams['font.family'] = 'Arial'
-
-    fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(9, 10))
-
-    for ax in [ax1, ax2]:
-        ax.spines['top'].set_visible(True)
-        ax.spines['right'].set_visible(True)
-        ax.spines['bottom'].set_visible(True)
-        ax.spines['left'].set_visible(True)
-        for spine in ax.spines.values():
-            spine.set_linewidth(1.5)
-
-    commodity_names = [ticker_to_name[comm] for comm in df['Moeda']]
-
-    # Gráfico YTD
-    performance_ytd = df['Performance YTD (%)'].values
-    bars1 = ax1.barh(commodity_names, performance_ytd,
-                     color=['#2E7D32' if x > 0 else '#F44336' for x in performance_ytd])
-    ax1.set_title('Performance YTD', fontsize=14, fontweight='bold')
-    
-    # Gráfico Semanal
-    performance_week = df_weekly['Performance Semanal (%)'].values
-    bars2 = ax2.barh(commodity_names, performance_week,
-                     color=['#2E7D32' if x > 0 else '#F44336' for x in performance_week])
-    ax2.set_title('Performance Semanal', fontsize=14, fontweight='bold')
-
-    # Adicionar valores nas barras para ambos os gráficos
-    for ax, bars, performance in [(ax1, bars1, performance_ytd), (ax2, bars2, performance_week)]:
-        max_value = max(abs(performance.min()), abs(performance.max()))
-        ax.set_xlim(-(max_value + 0.5), max_value + 0.5)
-        
-        for bar in bars:
-            width = bar.get_width()
-            offset = 0.05 * max_value
-            ax.text(width + (offset if width > 0 else -offset), 
-                    bar.get_y() + bar.get_height()/2,
-                    f"{width:+.2f}%", 
-                    va='center', 
-                    ha='left' if width > 0 else 'right',
-                    fontsize=10)
-        
-        ax.grid(axis='x', linestyle='--', alpha=0.5)
-        ax.set_xlabel('Performance (%)', fontsize=12)
-
-    plt.tight_layout()
-    
-    buffer = BytesIO()
-    plt.savefig(buffer, format='png', dpi=300, bbox_inches='tight')
-    plt.close()
-    buffer.seek(0)
-    return buffer
+    with chart_style():
+        # Criar dois subplots empilhados com tamanho menor
+        fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(9, 10))
+
+        # Configurar ambos os gráficos
+        for ax in [ax1, ax2]:
+            for spine in ax.spines.values():
+                spine.set_visible(True)
+                spine.set_linewidth(1.5)
+
+        # Gráfico YTD (ordem YTD) e gráfico semanal (ordem semanal)
+        performance_ytd = df['Performance YTD (%)'].to_numpy()
+        bars1 = ax1.barh(registry.display_names(df['Moeda']), performance_ytd,
+                         color=np.where(performance_ytd > 0, '#2E7D32', '#F44336'))
+        ax1.set_title('Performance YTD', fontsize=14, fontweight='bold')
 
-def create_enhanced_commodities_pdf(chart_image):
-    # Usar a mesma lógica do create_enhanced_pdf(), mas para commodities
-    slide_width = 16 * inch
-    slide_height = 9 * inch
-
-    doc = SimpleDocTemplate("enhanced_commodities_report.pdf",
-                          pagesize=(slide_width, slide_height),
-                          rightMargin=30,
-                          leftMargin=30,
-                          topMargin=30,
-                          bottomMargin=30)
-
-    story = []
-    elements = []
-    
-    img = Image(chart_image, width=6 * inch, height=7 * inch)
-    
-    df = pd.read_csv('commodity_data.csv')
-    df = df.rename(columns={
-        'Performance YTD (%)': 'YTD',
-        'Performance Semanal (%)': 'Δ Semana'
-    })
-    
-    # Criar um dicionário reverso para mapear tickers para nomes
-    ticker_to_name = {}
-    for commodity, info in commodities.items():
-        ticker_to_name[info['ticker']] = info['name']
-    
-    table_data = [['Commodity', 'YTD', 'Δ Semana']]
-    for i, row in df.iterrows():
-        table_data.append([
-            ticker_to_name[row['Moeda']],
-            f"{row['YTD']:+.2f}%",
-            f"{row['Δ Semana']:+.2f}%"
-        ])
-
-    table = Table(table_data, colWidths=[160, 80, 80])
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#2E7D32')),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 6),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.white),
-        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-        ('FONTSIZE', (0, 0), (-1, -1), 9),
-        ('ALIGN', (1, 1), (-1, -1), 'RIGHT'),
-        ('ALIGN', (0, 0), (0, -1), 'LEFT'),
-    ]))
-
-    layout_table = Table([[img, table]], colWidths=[7.5*inch, 6*inch])
-    layout_table.setStyle(TableStyle([
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-    ]))
-
-    story.append(layout_table)
-    doc.build(story)
-
-def create_combined_pdf(currency_chart, commodity_chart):
-    # Proporção de slide (16:9)
-    slide_width = 16 * inch
-    slide_height = 9 * inch
-
-    doc = SimpleDocTemplate("combined_market_report.pdf",
-                          pagesize=(slide_width, slide_height),
-                          rightMargin=30,
-                          leftMargin=30,
-                          topMargin=30,
-                          bottomMargin=30)
-
-    story = []
-    
-    # Página 1 - Moedas
-    currency_img = Image(currency_chart, width=6 * inch, height=7 * inch)
-    df_currencies = pd.read_csv('currency_data.csv')
-    df_currencies = df_currencies.rename(columns={
-        'Performance YTD (%)': 'YTD',
-        'Performance Semanal (%)': 'Δ Semana'
-    })
-
-    # Criar dicionário para moedas
-    currency_to_name = {}
-    for currency, info in currencies.items():
-        currency_to_name[info['ticker']] = info['name']
-        if currency == 'DXY':
-            currency_to_name['DXY'] = 'Índice do Dólar (DXY)'
-    
-    # Tabela de moedas
-    currency_table_data = [['Moeda', 'YTD', 'Δ Semana']]
-    for i, row in df_currencies.iterrows():
-        try:
-            if row['Moeda'] == 'DX-Y.NYB' or row['Moeda'] == 'DXY':
-                name = 'Índice do Dólar (DXY)'
-            else:
-                name = currency_to_name[row['Moeda']]
-            
-            currency_table_data.append([
-                name,
-                f"{row['YTD']:+.2f}%",
-                f"{row['Δ Semana']:+.2f}%"
-            ])
-        except KeyError as e:
-            print(f"Erro na moeda: {row['Moeda']}")
-            print(f"Dicionário disponível: {currency_to_name}")
-            raise e
-
-    currency_table = Table(currency_table_data, colWidths=[160, 80, 80])
-    currency_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#2E7D32')),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 6),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.white),
-        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-        ('FONTSIZE', (0, 0), (-1, -1), 9),
-        ('ALIGN', (1, 1), (-1, -1), 'RIGHT'),
-        ('ALIGN', (0, 0), (0, -1), 'LEFT'),
-    ]))
-
-    currency_layout = Table([[currency_img, currency_table]], colWidths=[7.5*inch, 6*inch])
-    currency_layout.setStyle(TableStyle([
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-    ]))
-
-    story.append(currency_layout)
-    story.append(PageBreak())  # Adiciona quebra de página
-
-    # Página 2 - Commodities
-    commodity_img = Image(commodity_chart, width=6 * inch, height=7 * inch)
-    df_commodities = pd.read_csv('commodity_data.csv')
-    df_commodities = df_commodities.rename(columns={
-        'Performance YTD (%)': 'YTD',
-        'Performance Semanal (%)': 'Δ Semana'
-    })
-
-    # Criar dicionário para commodities
-    commodity_to_name = {}
-    for commodity, info in commodities.items():
-        commodity_to_name[info['ticker']] = info['name']
-    
-    # Tabela de commodities
-    commodity_table_data = [['Commodity', 'YTD', 'Δ Semana']]
-    for i, row in df_commodities.iterrows():
-        try:
-            name = commodity_to_name[row['Moeda']]
-            commodity_table_data.append([
-                name,
-                f"{row['YTD']:+.2f}%",
-                f"{row['Δ Semana']:+.2f}%"
-            ])
-        except KeyError as e:
-            print(f"Erro na commodity: {row['Moeda']}")
-            print(f"Dicionário disponível: {commodity_to_name}")
-            raise e
-
-    commodity_table = Table(commodity_table_data, colWidths=[160, 80, 80])
-    commodity_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#2E7D32')),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 6),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.white),
-        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-        ('FONTSIZE', (0, 0), (-1, -1), 9),
-        ('ALIGN', (1, 1), (-1, -1), 'RIGHT'),
-        ('ALIGN', (0, 0), (0, -1), 'LEFT'),
-    ]))
-
-    commodity_layout = Table([[commodity_img, commodity_table]], colWidths=[7.5*inch, 6*inch])
-    commodity_layout.setStyle(TableStyle([
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-    ]))
-
-    story.append(commodity_layout)
-    doc.build(story)
+        performance_week = df_weekly['Performance Semanal (%)'].to_numpy()
+        bars2 = ax2.barh(registry.display_names(df_weekly['Moeda']), performance_week,
+                         color=np.where(performance_week > 0, '#2E7D32', '#F44336'))
+        ax2.set_title('Performance Semanal', fontsize=14, fontweight='bold')
+
+        # Adicionar valores nas barras para ambos os gráficos
+        for ax, bars, performance in [(ax1, bars1, performance_ytd), (ax2, bars2, performance_week)]:
+            max_value = max(abs(performance.min()), abs(performance.max())) if len(performance) else 0.0
+            ax.set_xlim(-(max_value + 0.5), max_value + 0.5)
+
+            offset = 0.05 * max_value
+            for bar, text in zip(bars, format_returns(performance)):
+                width = bar.get_width()
+                ax.text(width + (offset if width > 0 else -offset),
+                        bar.get_y() + bar.get_height()/2,
+                        text,
+                        va='center',
+                        ha='left' if width > 0 else 'right',
+                        fontsize=10)
+
+            ax.grid(axis='x', linestyle='--', alpha=0.5)
+            ax.set_xlabel('Performance (%)', fontsize=12)
+
+        plt.tight_layout()
+
+        return save_chart(fmt, dpi)
+
+def create_enhanced_chart(df=None, fmt=None, dpi=None, registry=REGISTRY):
+    return performance_chart(load_table(df, 'currency_data.csv'), fmt, dpi, registry)
+
+def create_enhanced_commodities_chart(df=None, fmt=None, dpi=None, registry=REGISTRY):
+    return performance_chart(load_table(df, 'commodity_data.csv'), fmt, dpi, registry)
+
+def create_enhanced_pdf(chart_image, df=None, output_path="enhanced_currency_report.pdf", registry=REGISTRY):
+    from report_layout import build_report
+
+    df = load_table(df, 'currency_data.csv')
+    build_report([(chart_image, df, 'Moeda')], output_path, registry)
+
+def create_enhanced_commodities_pdf(chart_image, df=None, output_path="enhanced_commodities_report.pdf",
+                                    registry=REGISTRY):
+    from report_layout import build_report
+
+    df = load_table(df, 'commodity_data.csv')
+    build_report([(chart_image, df, 'Commodity')], output_path, registry)
+
+# Mapa de calor da matriz de correlação (ticker x ticker). Acima de
+# HEATMAP_MAX_LABELS ativos os nomes nos eixos são omitidos
+def create_correlation_heatmap(df, fmt=None, dpi=None, registry=REGISTRY):
+    import matplotlib.pyplot as plt
+
+    names = registry.display_names(df.index)
+
+    with chart_style():
+        fig, ax = plt.subplots(figsize=(9, 8))
+        image = ax.imshow(df.to_numpy(dtype=float), cmap='RdYlGn', vmin=-1, vmax=1,
+                          interpolation='nearest', aspect='auto')
+        fig.colorbar(image, ax=ax, fraction=0.046, pad=0.04)
+        ax.set_title('Correlação dos Retornos Diários', fontsize=14, fontweight='bold')
+
+        if len(names) <= HEATMAP_MAX_LABELS:
+            fontsize = 8 if len(names) <= 30 else 5
+            ax.set_xticks(range(len(names)))
+            ax.set_xticklabels(names, rotation=90, fontsize=fontsize)
+            ax.set_yticks(range(len(names)))
+            ax.set_yticklabels(names, fontsize=fontsize)
+        else:
+            ax.set_xticks([])
+            ax.set_yticks([])
+            ax.set_xlabel(f'{len(names)} ativos', fontsize=12)
+
+        plt.tight_layout()
+
+        return save_chart(fmt, dpi)
+
+# Linhas da tabela de análises: volatilidade, drawdown e z-score por ativo. Em
+# universos grandes ficam só os ANALYTICS_TABLE_ROWS movimentos mais atípicos
+def analytics_table_data(df, registry=REGISTRY):
+    df = df.reindex(df['Z-score'].abs().sort_values(ascending=False, na_position='last').index)
+    df = df.head(ANALYTICS_TABLE_ROWS)
+    columns = [registry.display_names(df['Moeda']),
+               format_returns(df['Volatilidade (%)'], '%.1f%%'),
+               format_returns(df['Máx. Drawdown (%)'], '%.1f%%'),
+               format_returns(df['Último Retorno (%)']),
+               format_returns(df['Z-score'], '%+.1f')]
+    table_data = [['Ativo', 'Vol. anual.', 'Máx. DD', 'Últ. mov.', 'Z-score']]
+    table_data += [list(row) for row in zip(*columns)]
+    return table_data
+
+# Página de análises: mapa de calor das correlações ao lado da tabela de risco
+def analytics_page(heatmap, df, registry=REGISTRY):
+    from reportlab.lib.units import inch
+
+    from report_layout import section_layout, styled_table
+
+    image = chart_flowable(heatmap, width=7 * inch, height=6.2 * inch)
+    table = styled_table(analytics_table_data(df, registry), [150, 65, 65, 65, 55])
+    return section_layout(image, table, table_width=6.5 * inch)
+
+def create_combined_pdf(currency_chart, commodity_chart, df_currencies=None, df_commodities=None,
+                        output_path="combined_market_report.pdf", registry=REGISTRY,
+                        rows_per_page=None, group_by=None, chart_format=None, chart_dpi=None,
+                        analytics=None, heatmap_chart=None, output_cache=None, render_workers=None):
+    from report_layout import build_paginated_pdf, build_report, page_rows
+
+    df_currencies = load_table(df_currencies, 'currency_data.csv')
+    df_commodities = load_table(df_commodities, 'commodity_data.csv')
+
+    # Com `analytics` (tabela de risco, matriz de correlação, de analytics.py) o
+    # relatório ganha uma página final com o mapa de calor, renderizado aqui se
+    # `heatmap_chart` não vier pronto. `output_cache` reaproveita gráficos já
+    # renderizados com o mesmo conteúdo
+    extra_pages = []
+    if analytics is not None:
+        stats, corr = analytics
+        if heatmap_chart is None:
+            from render_pool import render_charts
+
+            heatmap_chart, = render_charts([('create_correlation_heatmap', corr, chart_format,
+                                             chart_dpi, registry)], max_workers=1, cache=output_cache)
+        extra_pages.append(analytics_page(heatmap_chart, stats, registry))
+
+    # Universos que não cabem em um slide por classe (ou agrupados com `group_by`)
+    # usam o layout paginado, com gráfico e tabela por bloco de ativos; nesse caso
+    # os gráficos recebidos são ignorados e os de cada página são renderizados em
+    # até `render_workers` processos. Acima do que cabe em um slide, pagina sempre
+    rows_per_page = page_rows(rows_per_page)
+    if group_by is not None or max(len(df_currencies), len(df_commodities)) > rows_per_page:
+        build_paginated_pdf([
+            ('Moedas', df_currencies, 'Moeda', create_enhanced_chart),
+            ('Commodities', df_commodities, 'Commodity', create_enhanced_commodities_chart),
+        ], output_path, rows_per_page, group_by, chart_format, chart_dpi, registry, extra_pages,
+            output_cache, render_workers)
+        return
+
+    # Página 1 - Moedas, página 2 - Commodities, depois as páginas extras
+    build_report([
+        (currency_chart, df_currencies, 'Moeda'),
+        (commodity_chart, df_commodities, 'Commodity'),
+    ], output_path, registry, extra_pages)
 
 # Gerar ambos os relatórios
 if __name__ == "__main__":
-    # Gerar gráficos
-    enhanced_chart = create_enhanced_chart()
-    chart_path = "enhanced_chart.png"
-    with open(chart_path, "wb") as f:
-        f.write(enhanced_chart.getbuffer())
+    from render_pool import render_charts
 
-    enhanced_commodities_chart = create_enhanced_commodities_chart()
-    commodities_chart_path = "enhanced_commodities_chart.png"
-    with open(commodities_chart_path, "wb") as f:
-        f.write(enhanced_commodities_chart.getbuffer())
+    # Gerar gráficos em memória, sem arquivos temporários, cada um em um processo
+    enhanced_chart, enhanced_commodities_chart = render_charts([
+        ('create_enhanced_chart', None, None, None),
+        ('create_enhanced_commodities_chart', None, None, None),
+    ])
 
     # Criar PDF combinado
-    create_combined_pdf(chart_path, commodities_chart_path)
-
-    # Limpar arquivos temporários
-    os.remove(chart_path)
-    os.remove(commodities_chart_path)
+    create_combined_pdf(enhanced_chart, enhanced_commodities_chart)
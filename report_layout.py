@@ -0,0 +1,275 @@
+import os
+from functools import partial
+from io import BytesIO
+
+from reportlab.lib import colors
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.lib.units import inch
+from reportlab.platypus import Flowable, PageBreak, Paragraph, SimpleDocTemplate, Table, TableStyle
+
+import instrumentation
+from assets import REGISTRY
+from report_generator import chart_flowable, performance_table_data
+
+# Máximo de ativos por página (gráfico + tabela) no relatório paginado
+ROWS_PER_PAGE = 28
+
+# Linhas que cabem em um slide com título: a tabela fica em uma célula do layout
+# e não pode ser quebrada entre páginas, então valores maiores são reduzidos a este
+MAX_ROWS_PER_PAGE = 28
+
+# Proporção de slide (16:9)
+SLIDE_SIZE = (16 * inch, 9 * inch)
+
+TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#2E7D32')),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 6),
+    ('BACKGROUND', (0, 1), (-1, -1), colors.white),
+    ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+    ('FONTSIZE', (0, 0), (-1, -1), 9),
+    ('ALIGN', (1, 1), (-1, -1), 'RIGHT'),
+    ('ALIGN', (0, 0), (0, -1), 'LEFT'),
+])
+
+LAYOUT_STYLE = TableStyle([
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+])
+
+RENAMED_COLUMNS = {
+    'Performance YTD (%)': 'YTD',
+    'Performance Semanal (%)': 'Δ Semana',
+}
+
+# Título de cada seção no relatório paginado, criado uma vez por processo
+TITLE_STYLE = getSampleStyleSheet()['Heading3']
+
+# Tamanho do gráfico e larguras das colunas do layout (gráfico | tabela)
+CHART_SIZE = (6 * inch, 7 * inch)
+CHART_COLUMN_WIDTH = 7.5 * inch
+TABLE_COLUMN_WIDTH = 6 * inch
+
+# Largura útil do slide (sem margens e bordas do quadro), espaçamento de uma
+# célula do layout e menor coluna de gráfico aceita quando a tabela cresce
+LAYOUT_WIDTH = SLIDE_SIZE[0] - 60 - 12
+CELL_PADDING = 12
+MIN_CHART_COLUMN_WIDTH = 4 * inch
+
+# Larguras das colunas da tabela de performance: nome, YTD, semanal e cada horizonte extra
+NAME_WIDTH = 160
+RETURN_WIDTH = 80
+HORIZON_WIDTH = 55
+
+# Colunas de horizonte mais estreitas que HORIZON_WIDTH usam fonte e margens menores
+COMPACT_STYLE = [
+    ('FONTSIZE', (3, 0), (-1, -1), 7),
+    ('LEFTPADDING', (3, 0), (-1, -1), 2),
+    ('RIGHTPADDING', (3, 0), (-1, -1), 2),
+]
+
+
+def slide_document(output_path):
+    # Documento em proporção de slide, com as margens de todos os relatórios
+    return SimpleDocTemplate(output_path,
+                             pagesize=SLIDE_SIZE,
+                             rightMargin=30,
+                             leftMargin=30,
+                             topMargin=30,
+                             bottomMargin=30)
+
+
+def styled_table(table_data, col_widths):
+    # Tabela com o estilo compartilhado
+    table = Table(table_data, colWidths=col_widths)
+    table.setStyle(TABLE_STYLE)
+    return table
+
+
+def horizon_width(count):
+    # Largura de cada coluna de horizonte: a padrão enquanto a tabela couber ao
+    # lado do menor gráfico aceito, dividindo o espaço que sobra a partir daí
+    room = LAYOUT_WIDTH - MIN_CHART_COLUMN_WIDTH - CELL_PADDING - NAME_WIDTH - 2 * RETURN_WIDTH
+    return min(HORIZON_WIDTH, room / count) if count else HORIZON_WIDTH
+
+
+def performance_table(df, header, registry=REGISTRY):
+    # Tabela de performance de uma seção a partir da tabela de currency_data.py
+    table_data, extra_columns = performance_table_data(df.rename(columns=RENAMED_COLUMNS), header, registry)
+    width = horizon_width(len(extra_columns))
+    table = styled_table(table_data, [NAME_WIDTH, RETURN_WIDTH, RETURN_WIDTH] + [width] * len(extra_columns))
+    if width < HORIZON_WIDTH:
+        table.setStyle(TableStyle(COMPACT_STYLE))
+    return table
+
+
+def section_layout(image, table, table_width=TABLE_COLUMN_WIDTH, chart_width=CHART_COLUMN_WIDTH):
+    # Gráfico à esquerda, tabela à direita, centralizados na página
+    layout = Table([[image, table]], colWidths=[chart_width, table_width])
+    layout.setStyle(LAYOUT_STYLE)
+    return layout
+
+
+def section_page(chart, df, header, registry=REGISTRY):
+    # A coluna da tabela cresce com os horizontes extras e o gráfico encolhe, na
+    # mesma proporção, para que os dois continuem cabendo lado a lado no slide
+    table = performance_table(df, header, registry)
+    table_width = max(TABLE_COLUMN_WIDTH, sum(table._colWidths) + CELL_PADDING)
+    chart_width = min(CHART_COLUMN_WIDTH, LAYOUT_WIDTH - table_width)
+    width = min(CHART_SIZE[0], chart_width - CELL_PADDING)
+    image = chart_flowable(chart, width, width * CHART_SIZE[1] / CHART_SIZE[0])
+    return section_layout(image, table, table_width, chart_width)
+
+
+def build_report(sections, output_path, registry=REGISTRY, extra_pages=()):
+    # Relatório de um slide por seção, montado em uma única passada. `sections` é
+    # uma lista de (gráfico já renderizado, DataFrame, cabeçalho da tabela), com
+    # quantas classes de ativos houver; `extra_pages` vêm ao final
+    story = []
+    for chart, df, header in sections:
+        if story:
+            story.append(PageBreak())
+        story.append(section_page(chart, df, header, registry))
+    for page in extra_pages:
+        story.append(PageBreak())
+        story.append(page)
+
+    with instrumentation.span('layout.build', pages=len(sections) + len(extra_pages)):
+        slide_document(output_path).build(story)
+
+
+def page_rows(rows_per_page=None):
+    # Linhas por página efetivas: o padrão, ou o pedido limitado ao que cabe no slide
+    rows_per_page = rows_per_page or ROWS_PER_PAGE
+    if rows_per_page > MAX_ROWS_PER_PAGE:
+        instrumentation.warning(f"{rows_per_page} linhas não cabem em uma página; usando {MAX_ROWS_PER_PAGE}")
+        return MAX_ROWS_PER_PAGE
+    return rows_per_page
+
+
+def paginate(df, rows_per_page=ROWS_PER_PAGE, group_by=None):
+    # Divide a tabela em blocos de no máximo `rows_per_page` linhas. Com `group_by`
+    # (função rótulo -> grupo), cada grupo começa em uma página nova
+    if group_by is None:
+        groups = [(None, df)]
+    else:
+        keys = df['Moeda'].map(group_by)
+        groups = [(key, df[keys == key]) for key in dict.fromkeys(keys)]
+
+    pages = []
+    for key, group in groups:
+        for start in range(0, len(group), rows_per_page):
+            pages.append((key, group.iloc[start:start + rows_per_page]))
+    return pages
+
+
+class ChartBatches:
+    # Gráficos das páginas renderizados em lotes de `batch` páginas, em paralelo,
+    # à medida que o PDF avança: pedir a primeira página de um lote renderiza o
+    # lote inteiro e descarta o anterior, então só um lote fica na memória
+
+    def __init__(self, jobs, batch, max_workers=None, cache=None):
+        self.jobs = jobs
+        self.batch = max(1, batch)
+        self.max_workers = max_workers
+        self.cache = cache
+        self.charts = {}
+
+    def take(self, index):
+        # Bytes do gráfico da página `index`
+        if index not in self.charts:
+            from render_pool import render_charts
+
+            stop = min(index + self.batch, len(self.jobs))
+            with instrumentation.span('layout.charts', pages=stop - index):
+                rendered = render_charts(self.jobs[index:stop], max_workers=self.max_workers, cache=self.cache)
+            self.charts = {i: chart.getvalue() for i, chart in zip(range(index, stop), rendered)}
+        return self.charts.pop(index)
+
+
+class LazyPage(Flowable):
+    # Página de gráfico + tabela montada só na hora de desenhar: o desenho do
+    # gráfico e a tabela são criados em wrap() e descartados após draw(), então a
+    # memória fica limitada a uma página por vez. `chart` é uma função sem
+    # argumentos que devolve os bytes do gráfico (em build_paginated_pdf, vindos de
+    # um ChartBatches); sem ela, o gráfico é renderizado aqui. Com `cache`
+    # (output_cache.OutputCache) o gráfico de uma página inalterada é reaproveitado.
+    # A tabela fica em uma célula do layout e não se divide entre páginas: cada
+    # página tem no máximo MAX_ROWS_PER_PAGE linhas
+
+    def __init__(self, chart_builder, df, header, fmt=None, dpi=None, registry=REGISTRY, cache=None,
+                 chart=None):
+        super().__init__()
+        self.chart_builder = chart_builder
+        self.df = df
+        self.header = header
+        self.fmt = fmt
+        self.dpi = dpi
+        self.registry = registry
+        self.cache = cache
+        self.chart = chart
+        self._layout = None
+
+    def _render_chart(self):
+        return self.chart_builder(self.df, self.fmt, self.dpi, self.registry).getvalue()
+
+    def _build(self):
+        with instrumentation.span('layout.chart', rows=len(self.df)):
+            if self.chart is not None:
+                chart = BytesIO(self.chart())
+            elif self.cache is None:
+                chart = BytesIO(self._render_chart())
+            else:
+                from render_pool import chart_key
+
+                key = chart_key(self.chart_builder.__name__, self.df, self.fmt, self.dpi, self.registry)
+                chart = BytesIO(self.cache.fetch(key, self._render_chart))
+        return section_page(chart, self.df, self.header, self.registry)
+
+    def wrap(self, available_width, available_height):
+        if self._layout is None:
+            self._layout = self._build()
+        return self._layout.wrap(available_width, available_height)
+
+    def draw(self):
+        self._layout.drawOn(self.canv, 0, 0)
+        self._layout = None
+
+
+def build_paginated_pdf(sections, output_path, rows_per_page=ROWS_PER_PAGE, group_by=None,
+                        fmt=None, dpi=None, registry=REGISTRY, extra_pages=(), cache=None,
+                        render_workers=None):
+    # Gera o relatório com quantas páginas forem necessárias. `sections` é uma lista
+    # de (título, DataFrame, cabeçalho da tabela, função de report_generator que
+    # monta o gráfico); `extra_pages` são flowables prontos, cada um em uma página
+    # ao final. Os gráficos são renderizados em paralelo, em até `render_workers`
+    # processos, um lote de páginas de cada vez (ChartBatches)
+    rows_per_page = page_rows(rows_per_page)
+    entries = []
+    for title, df, header, chart_builder in sections:
+        pages = paginate(df, rows_per_page, group_by)
+        for number, (group, page) in enumerate(pages, start=1):
+            label = f"{title} — {group}" if group else title
+            if len(pages) > 1:
+                label += f" ({number}/{len(pages)})"
+            entries.append((label, chart_builder, page, header))
+
+    charts = ChartBatches([(chart_builder.__name__, page, fmt, dpi, registry)
+                           for _, chart_builder, page, _ in entries],
+                          render_workers or os.cpu_count() or 1, render_workers, cache)
+
+    story = []
+    for index, (label, chart_builder, page, header) in enumerate(entries):
+        if story:
+            story.append(PageBreak())
+        story.append(Paragraph(label, TITLE_STYLE))
+        story.append(LazyPage(chart_builder, page, header, fmt, dpi, registry, cache,
+                              partial(charts.take, index)))
+    for page in extra_pages:
+        story.append(PageBreak())
+        story.append(page)
+
+    with instrumentation.span('layout.build', pages=sum(isinstance(f, LazyPage) for f in story)):
+        slide_document(output_path).build(story)
@@ -0,0 +1,318 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from io import BytesIO
+
+import instrumentation
+from currency_data import add_data_arguments, data_options, parse_horizons
+
+# Tempo (em segundos) que painel, tabelas e renderizações ficam válidos na memória
+DEFAULT_TTL = 300
+
+# Máximo de entradas no TTLCache; acima disso saem as usadas há mais tempo
+DEFAULT_MAX_ENTRIES = 128
+
+# Resoluções aceitas no parâmetro `dpi` e máximo de horizontes por requisição:
+# cada combinação distinta vira uma entrada de cache
+ALLOWED_DPI = (72, 100, 150, 200, 300)
+MAX_HORIZONS = 12
+
+# Classes de ativos aceitas no filtro `class`
+ASSET_CLASSES = {'currency': 'currencies', 'commodity': 'commodities'}
+
+# Tipo de conteúdo de cada formato servido
+CONTENT_TYPES = {'json': 'application/json', 'pdf': 'application/pdf', 'png': 'image/png'}
+
+
+def etag(data):
+    return '"' + hashlib.sha256(data).hexdigest()[:32] + '"'
+
+
+def tagged(data, expires):
+    # Bytes servidos junto com o ETag, calculado uma vez e guardado no cache, e o
+    # instante (time.monotonic()) em que deixam de valer
+    return data, etag(data), expires
+
+
+class TTLCache:
+    # Cache em memória com validade por entrada e coalescência de requisições:
+    # pedidos simultâneos para a mesma chave esperam o mesmo cálculo, feito uma vez.
+    # Entradas vencidas são descartadas a cada gravação e o total fica limitado a
+    # `max_entries`, descartando as usadas há mais tempo
+
+    def __init__(self, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._inflight = {}
+
+    async def get(self, key, compute, ttl=None, expires=None):
+        # Devolve o valor em cache ou aguarda `compute()` (corrotina) uma única vez por
+        # chave. Com `expires` (função do valor calculado -> instante de
+        # time.monotonic()) a validade vem do próprio valor, em vez de `ttl` a partir de agora
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            instrumentation.count('service_cache_hits')
+            self._entries.move_to_end(key)
+            return entry[1]
+
+        task = self._inflight.get(key)
+        if task is None:
+            instrumentation.count('service_cache_misses')
+            task = asyncio.ensure_future(compute())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._store(key, t, ttl, expires))
+        else:
+            instrumentation.count('service_coalesced')
+        return await asyncio.shield(task)
+
+    def _store(self, key, task, ttl, expires):
+        self._inflight.pop(key, None)
+        if not task.cancelled() and task.exception() is None:
+            if expires is not None:
+                deadline = expires(task.result())
+            else:
+                deadline = time.monotonic() + (self.ttl if ttl is None else ttl)
+            self._entries[key] = (deadline, task.result())
+            self._entries.move_to_end(key)
+            self.prune()
+
+    def prune(self):
+        # Remove as entradas vencidas e, acima do limite, as menos usadas
+        now = time.monotonic()
+        for key in [key for key, (expires, _) in self._entries.items() if expires <= now]:
+            del self._entries[key]
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            instrumentation.count('service_cache_evictions')
+
+    def clear(self):
+        self._entries.clear()
+
+
+class PerformanceService:
+    # Núcleo do serviço, independente do servidor HTTP: carrega o painel uma vez
+    # por janela de histórico, calcula as tabelas por base e horizontes e
+    # renderiza PDFs e gráficos, tudo através do TTLCache. Só o painel tem `ttl`
+    # próprio: tabelas e renderizações vencem junto com o painel de que vieram,
+    # para que nada seja servido mais que `ttl` depois da busca. Cálculos rodam em
+    # um pool de threads; renderizações, em uma thread só (o matplotlib não é thread-safe)
+
+    def __init__(self, ttl=DEFAULT_TTL, default_horizons=(), **data_kwargs):
+        self.cache = TTLCache(ttl)
+        self.ttl = ttl
+        self.default_horizons = list(default_horizons)
+        self.data_kwargs = data_kwargs
+        self.compute_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix='compute')
+        self.render_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='render')
+
+    async def _run(self, pool, name, func, *args, **attrs):
+        # Executa `func` no pool; o span é aberto dentro da thread, porque a pilha
+        # de spans é por thread e não pode atravessar um await
+        def timed():
+            with instrumentation.span(name, **attrs):
+                return func(*args)
+
+        return await asyncio.get_running_loop().run_in_executor(pool, timed)
+
+    async def panel(self, horizons):
+        # Painel em dólar com histórico suficiente para `horizons`; reaproveitado
+        # por todas as bases e classes que pedem a mesma janela
+        from currency_data import fetch_panel
+        from performance import history_start
+
+        now = datetime.now()
+        key = ('panel', history_start(horizons, now).strftime('%Y-%m-%d'))
+
+        async def compute():
+            stale = set()
+            expires = time.monotonic() + self.ttl
+            panel = await self._run(self.compute_pool, 'service.fetch',
+                                    lambda: fetch_panel(now, horizons, stale=stale, **self.data_kwargs))
+            return now, panel, stale, expires
+
+        return await self.cache.get(key, compute, expires=lambda value: value[-1])
+
+    async def tables(self, base='USD', horizons=()):
+        # (moedas, commodities, registro, data de referência, validade) para a moeda
+        # base e os horizontes pedidos; a validade é a do painel usado
+        from currency_data import performance_for_base
+
+        key = ('tables', base, tuple(horizons))
+
+        async def compute():
+            now, panel, stale, expires = await self.panel(horizons)
+            df_currencies, df_commodities, registry = await self._run(
+                self.compute_pool, 'service.compute', performance_for_base, panel, base, now, horizons,
+                stale, base=base)
+            return df_currencies, df_commodities, registry, now, expires
+
+        return await self.cache.get(key, compute, expires=lambda value: value[-1])
+
+    async def performance_json(self, base='USD', horizons=(), asset_class=None):
+        key = ('json', base, tuple(horizons), asset_class)
+
+        async def compute():
+            df_currencies, df_commodities, registry, now, expires = await self.tables(base, horizons)
+            frames = {'currencies': df_currencies, 'commodities': df_commodities}
+            if asset_class is not None:
+                frames = {ASSET_CLASSES[asset_class]: frames[ASSET_CLASSES[asset_class]]}
+            payload = {
+                'base': base,
+                'as_of': now.isoformat(timespec='seconds'),
+                'horizons': list(horizons),
+                **{name: json.loads(df.to_json(orient='records')) for name, df in frames.items()},
+            }
+            return tagged(json.dumps(payload, ensure_ascii=False).encode('utf-8'), expires)
+
+        return await self.cache.get(key, compute, expires=lambda value: value[-1])
+
+    async def report_pdf(self, base='USD', horizons=()):
+        key = ('pdf', base, tuple(horizons))
+
+        async def compute():
+            df_currencies, df_commodities, registry, _, expires = await self.tables(base, horizons)
+            return tagged(await self._run(self.render_pool, 'service.pdf', _render_pdf, df_currencies,
+                                          df_commodities, registry, base=base), expires)
+
+        return await self.cache.get(key, compute, expires=lambda value: value[-1])
+
+    async def chart_png(self, base='USD', horizons=(), asset_class='currency', dpi=None):
+        key = ('png', base, tuple(horizons), asset_class, dpi)
+
+        async def compute():
+            df_currencies, df_commodities, registry, _, expires = await self.tables(base, horizons)
+            df = df_currencies if asset_class == 'currency' else df_commodities
+            return tagged(await self._run(self.render_pool, 'service.chart', _render_chart, asset_class, df,
+                                          dpi, registry, base=base, asset_class=asset_class), expires)
+
+        return await self.cache.get(key, compute, expires=lambda value: value[-1])
+
+    def close(self):
+        self.compute_pool.shutdown(wait=False)
+        self.render_pool.shutdown(wait=False)
+
+
+def _render_pdf(df_currencies, df_commodities, registry):
+    import report_generator
+
+    buffer = BytesIO()
+    currency_chart = report_generator.create_enhanced_chart(df_currencies, registry=registry)
+    commodity_chart = report_generator.create_enhanced_commodities_chart(df_commodities, registry=registry)
+    report_generator.create_combined_pdf(currency_chart, commodity_chart, df_currencies, df_commodities,
+                                         output_path=buffer, registry=registry)
+    return buffer.getvalue()
+
+
+def _render_chart(asset_class, df, dpi, registry):
+    import report_generator
+
+    builder = (report_generator.create_enhanced_chart if asset_class == 'currency'
+               else report_generator.create_enhanced_commodities_chart)
+    return builder(df, 'png', dpi, registry).getvalue()
+
+
+def create_app(service):
+    # Aplicação aiohttp com os endpoints do serviço. aiohttp é opcional: só é
+    # necessário para servir por HTTP
+    from aiohttp import web
+
+    def request_options(request):
+        query = request.query
+        base = query.get('base', 'USD').upper()
+        horizons = parse_horizons(query['horizons']) if 'horizons' in query else service.default_horizons
+        if len(horizons) > MAX_HORIZONS:
+            raise web.HTTPBadRequest(text=f"no máximo {MAX_HORIZONS} horizontes por requisição")
+        asset_class = query.get('class')
+        if asset_class is not None and asset_class not in ASSET_CLASSES:
+            raise web.HTTPBadRequest(text=f"classe desconhecida: {asset_class}")
+        return base, horizons, asset_class
+
+    def request_dpi(request):
+        # Só resoluções da lista: cada dpi distinto seria um PNG a mais no cache
+        if 'dpi' not in request.query:
+            return None
+        try:
+            dpi = int(request.query['dpi'])
+        except ValueError:
+            dpi = None
+        if dpi not in ALLOWED_DPI:
+            raise web.HTTPBadRequest(text=f"dpi deve ser um de {', '.join(map(str, ALLOWED_DPI))}")
+        return dpi
+
+    def respond(request, tagged_data, fmt):
+        # O max-age é o que resta da validade do painel, não um TTL inteiro a mais
+        data, tag, expires = tagged_data
+        max_age = max(0, int(expires - time.monotonic()))
+        headers = {'ETag': tag, 'Cache-Control': f'max-age={max_age}'}
+        if tag in request.headers.get('If-None-Match', ''):
+            return web.Response(status=304, headers=headers)
+        return web.Response(body=data, content_type=CONTENT_TYPES[fmt], headers=headers)
+
+    async def guarded(coro):
+        # Erros de entrada (base ou horizonte desconhecido) viram 400 em vez de 500
+        try:
+            return await coro
+        except (KeyError, ValueError) as e:
+            raise web.HTTPBadRequest(text=str(e))
+
+    async def performance(request):
+        base, horizons, asset_class = request_options(request)
+        data = await guarded(service.performance_json(base, horizons, asset_class))
+        return respond(request, data, 'json')
+
+    async def report(request):
+        base, horizons, _ = request_options(request)
+        data = await guarded(service.report_pdf(base, horizons))
+        return respond(request, data, 'pdf')
+
+    async def chart(request):
+        base, horizons, asset_class = request_options(request)
+        dpi = request_dpi(request)
+        data = await guarded(service.chart_png(base, horizons, asset_class or 'currency', dpi))
+        return respond(request, data, 'png')
+
+    async def health(request):
+        return web.json_response({'status': 'ok', 'counters': instrumentation.snapshot()['counters']})
+
+    async def on_cleanup(app):
+        service.close()
+
+    app = web.Application()
+    app.router.add_get('/performance', performance)
+    app.router.add_get('/report.pdf', report)
+    app.router.add_get('/chart.png', chart)
+    app.router.add_get('/health', health)
+    app.on_cleanup.append(on_cleanup)
+    return app
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serve tabelas de performance e relatórios por HTTP')
+    add_data_arguments(parser)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--ttl', type=float, default=DEFAULT_TTL,
+                        help='segundos que painel, tabelas e renderizações ficam em memória')
+    args = parser.parse_args(argv)
+
+    try:
+        from aiohttp import web
+    except ImportError:
+        raise SystemExit("O serviço HTTP requer aiohttp: pip install aiohttp")
+
+    import matplotlib
+    matplotlib.use('Agg')
+
+    service = PerformanceService(ttl=args.ttl, default_horizons=parse_horizons(args.horizons),
+                                 **data_options(args))
+    web.run_app(create_app(service), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import instrumentation
+from assets import REGISTRY
+from fileutil import atomic_write
+
+# Versão do formato dos arquivos parciais; a fusão recusa shards de outra versão
+SHARD_VERSION = 1
+
+
+def shard_of(ticker, shards):
+    # Shard de um ticker pelo CRC32 do nome: estável entre processos e máquinas
+    # (ao contrário de hash()) e independente da ordem do universo
+    return zlib.crc32(ticker.encode('utf-8')) % shards
+
+
+def shard_tickers(tickers, index, shards):
+    # Tickers do shard `index` (0 a shards-1), na ordem do universo
+    return [t for t in tickers if shard_of(t, shards) == index]
+
+
+def parse_shard(text):
+    # '3/8' -> (2, 8): shards numerados a partir de 1 na linha de comando
+    number, shards = (int(part) for part in text.split('/'))
+    if not 1 <= number <= shards:
+        raise ValueError(f"Shard inválido: {text}")
+    return number - 1, shards
+
+
+def _stem(directory, index, shards):
+    return os.path.join(directory, f'shard-{index + 1:03d}-of-{shards:03d}')
+
+
+def _is_shard_file(name, shards=None):
+    # Arquivos de shard (manifesto ou painel) da divisão em `shards`, ou de qualquer divisão
+    suffix = '' if shards is None else f'-of-{shards:03d}'
+    stem = os.path.splitext(name)[0]
+    return name.startswith('shard-') and stem.endswith(suffix) and '-of-' in stem
+
+
+def clear_shards(directory, shards=None):
+    # Apaga os parciais de execuções anteriores, para que a fusão não os misture aos novos
+    if not os.path.isdir(directory):
+        return
+    for name in os.listdir(directory):
+        if _is_shard_file(name, shards):
+            os.remove(os.path.join(directory, name))
+
+
+def write_partial(panel, path):
+    # Painel parcial em Arrow IPC (exato e rápido de ler); sem pyarrow, em CSV
+    # com floats em representação exata. Devolve o caminho gravado
+    from outputs import arrow_available
+
+    if arrow_available():
+        import pyarrow as pa
+
+        table = pa.Table.from_pandas(panel, preserve_index=True)
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+        atomic_write(path + '.arrow', sink.getvalue().to_pybytes())
+        return path + '.arrow'
+    atomic_write(path + '.csv', panel.to_csv(float_format='%.17g').encode('utf-8'))
+    return path + '.csv'
+
+
+def read_partial(path):
+    import pandas as pd
+
+    if path.endswith('.arrow'):
+        import pyarrow as pa
+
+        # O mapa fica aberto enquanto houver buffers do DataFrame apontando para ele
+        return pa.ipc.open_file(pa.memory_map(path, 'r')).read_all().to_pandas()
+    panel = pd.read_csv(path, index_col=0, parse_dates=True, float_precision='round_trip')
+    panel.index.name = None
+    return panel.astype('float64')
+
+
+def fetch_shard(index, shards, tickers, start, end, directory, **data_kwargs):
+    # Busca os tickers do shard e grava o painel parcial e o manifesto. O
+    # manifesto é gravado por último e marca o shard como completo; ele leva o
+    # universo inteiro e a janela, conferidos na fusão
+    from currency_data import load_price_panel, prepare_cache
+
+    os.makedirs(directory, exist_ok=True)
+    universe = list(tickers)
+    mine = shard_tickers(universe, index, shards)
+    # Invalidação e descarte valem para o universo inteiro, não só para o shard
+    prepare_cache(universe, data_kwargs.get('cache_path'), data_kwargs.pop('invalidate', None),
+                  data_kwargs.pop('evict_before', None))
+    stale = set()
+    with instrumentation.span('fetch.shard', shard=index + 1, shards=shards, tickers=len(mine)):
+        panel = load_price_panel(mine, start, end, stale=stale, refresh=False, **data_kwargs)
+        stem = _stem(directory, index, shards)
+        path = write_partial(panel.reindex(columns=mine), stem)
+
+    manifest = {
+        'version': SHARD_VERSION,
+        'shard': index,
+        'shards': shards,
+        'start': str(start),
+        'end': str(end),
+        'universe': universe,
+        'tickers': mine,
+        'stale': sorted(stale),
+        'panel': os.path.basename(path),
+    }
+    atomic_write(stem + '.json', json.dumps(manifest, ensure_ascii=False).encode('utf-8'))
+    return path
+
+
+def merge_shards(directory, shards=None):
+    # Junta os painéis parciais em um painel alinhado, igual ao de uma busca em um
+    # só processo: união das datas em ordem, colunas na ordem do universo e
+    # float64. Com `shards`, só os manifestos dessa divisão são lidos. Falta de
+    # shard, versão ou janela divergente é erro, nunca um painel incompleto.
+    # Devolve (painel, tickers defasados)
+    import pandas as pd
+
+    manifests = []
+    for name in sorted(os.listdir(directory)):
+        if _is_shard_file(name, shards) and name.endswith('.json'):
+            with open(os.path.join(directory, name), encoding='utf-8') as f:
+                manifests.append(json.load(f))
+    if not manifests:
+        raise FileNotFoundError(f"Nenhum shard encontrado em {directory}")
+
+    first = manifests[0]
+    shards = shards or first['shards']
+    for manifest in manifests:
+        for key in ('version', 'shards', 'start', 'end', 'universe'):
+            if manifest[key] != first[key]:
+                raise ValueError(f"Shard {manifest['shard'] + 1} incompatível: '{key}' diverge")
+    if first['version'] != SHARD_VERSION or first['shards'] != shards:
+        raise ValueError(f"Shards de versão {first['version']} / total {first['shards']} não suportados")
+    missing = sorted(set(range(shards)) - {m['shard'] for m in manifests})
+    if missing:
+        raise ValueError(f"Shards ausentes: {', '.join(str(i + 1) for i in missing)}")
+
+    stale = sorted({t for m in manifests for t in m['stale']})
+    with instrumentation.span('merge', shards=shards):
+        frames = [read_partial(os.path.join(directory, m['panel']))
+                  for m in sorted(manifests, key=lambda m: m['shard'])]
+        # Shards sem nenhuma data não entram no concat, que perderia o tipo do índice
+        frames = [frame for frame in frames if len(frame.index)]
+        if not frames:
+            return pd.DataFrame(columns=first['universe'], dtype=float), stale
+        panel = pd.concat(frames, axis=1).reindex(columns=first['universe']).sort_index()
+        panel = panel.astype('float64')
+        panel.index.name = None
+    return panel, stale
+
+
+def fetch_sharded(tickers, start, end, shards, directory=None, processes=None, stale=None, **data_kwargs):
+    # Busca o universo em `shards` processos locais (no máximo `processes` de uma
+    # vez) e funde o resultado. Sem `directory`, os parciais ficam em um diretório
+    # temporário apagado no fim; com ele, os parciais anteriores são apagados antes
+    from currency_data import prepare_cache, refresh_in_background
+
+    # Feito uma vez aqui: nos shards, em paralelo, um apagaria o que o outro acabou de buscar
+    prepare_cache(tickers, data_kwargs.get('cache_path'), data_kwargs.pop('invalidate', None),
+                  data_kwargs.pop('evict_before', None))
+    cleanup = directory is None
+    directory = directory or tempfile.mkdtemp(prefix='shards-')
+    clear_shards(directory)
+    try:
+        with ProcessPoolExecutor(max_workers=min(processes or shards, shards)) as pool:
+            futures = [pool.submit(fetch_shard, index, shards, tickers, start, end, directory, **data_kwargs)
+                       for index in range(shards)]
+            for future in futures:
+                future.result()
+        panel, shard_stale = merge_shards(directory, shards)
+    finally:
+        if cleanup:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    if stale is not None:
+        stale.update(shard_stale)
+    # Os shards não atualizam em segundo plano (o processo não terminaria antes);
+    # o processo principal faz isso uma vez para todos os defasados
+    if shard_stale and data_kwargs.get('use_cache', True) and data_kwargs.get('source', 'yfinance') == 'yfinance':
+        instrumentation.warning(f"{len(shard_stale)} ativos defasados: {', '.join(shard_stale)}")
+        refresh_in_background(shard_stale, start, end, 'yfinance', data_kwargs.get('cache_path'),
+                              data_kwargs.get('workers', 8), data_kwargs.get('rate', 5.0),
+                              data_kwargs.get('retries', 3), data_kwargs.get('timeout', 30.0))
+    return panel
+
+
+def main(argv=None):
+    # Modos: 'run' busca em processos locais e funde; 'fetch' busca um shard (um
+    # por máquina, no mesmo diretório compartilhado); 'merge' funde os parciais
+    from currency_data import add_data_arguments, data_options, parse_horizons
+    from performance import history_start
+
+    parser = argparse.ArgumentParser(description='Busca o universo de ativos dividido em shards')
+    parser.add_argument('mode', choices=['run', 'fetch', 'merge'])
+    add_data_arguments(parser)
+    parser.add_argument('--shard', help="shard deste processo no modo 'fetch', ex.: '3/8'")
+    parser.add_argument('--dir', help='diretório compartilhado dos painéis parciais')
+    parser.add_argument('--start', help='início da janela (padrão: pelo horizonte mais longo)')
+    parser.add_argument('--end', help='fim da janela, exclusivo (padrão: hoje)')
+    parser.add_argument('--output', help='grava o painel fundido neste caminho, sem extensão (.arrow, ou .csv sem pyarrow)')
+    parser.add_argument('--trace', metavar='ARQUIVO', help='grava tempos por etapa e contadores')
+    args = parser.parse_args(argv)
+
+    now = datetime.now()
+    start = args.start or history_start(parse_horizons(args.horizons), now).strftime('%Y-%m-%d')
+    end = args.end or now.strftime('%Y-%m-%d')
+    tickers = list(REGISTRY.tickers())
+    options = data_options(args)
+    options.pop('shard_dir', None)
+
+    if args.mode == 'fetch':
+        if not (args.shard and args.dir):
+            parser.error("o modo 'fetch' exige --shard e --dir")
+        index, shards = parse_shard(args.shard)
+        options.pop('shards', None)
+        print(f"✅ Shard {index + 1}/{shards} gravado em {fetch_shard(index, shards, tickers, start, end, args.dir, **options)}")
+    else:
+        if args.mode == 'merge':
+            if not args.dir:
+                parser.error("o modo 'merge' exige --dir")
+            panel, stale = merge_shards(args.dir)
+        else:
+            stale = set()
+            shards = options.pop('shards', None) or os.cpu_count() or 1
+            panel = fetch_sharded(tickers, start, end, shards, args.dir, stale=stale, **options)
+        print(f"✅ Painel fundido: {panel.shape[0]} datas x {panel.shape[1]} ativos ({len(stale)} defasados)")
+        if args.output:
+            write_partial(panel, args.output)
+
+    if args.trace:
+        instrumentation.write_trace(args.trace)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+import argparse
+import json
+import time
+from datetime import datetime, timedelta
+
+import instrumentation
+from assets import REGISTRY
+from currency_data import add_data_arguments, data_options, load_price_panel, parse_horizons
+from fileutil import atomic_write
+
+# Intervalo padrão entre consultas à fonte de preços, em segundos
+DEFAULT_INTERVAL = 300
+
+# Dias buscados a cada consulta para detectar fechamentos novos ou revisados
+TAIL_DAYS = 7
+
+def last_closes(panel):
+    # Último fechamento válido e sua data, por ticker
+    filled = panel.ffill()
+    dates = panel.apply(lambda col: col.last_valid_index())
+    return filled.iloc[-1], dates
+
+
+class Watcher:
+    # Modo contínuo: consulta a fonte periodicamente, recalcula só os ativos com
+    # fechamentos novos e re-renderiza apenas os gráficos das classes afetadas
+
+    def __init__(self, horizons=(), report_path='combined_market_report.pdf', json_path=None,
+                 chart_format=None, chart_dpi=None, registry=REGISTRY, **data_kwargs):
+        self.horizons = list(horizons)
+        self.report_path = report_path
+        self.json_path = json_path
+        self.chart_format = chart_format
+        self.chart_dpi = chart_dpi
+        self.registry = registry
+        self.data_kwargs = data_kwargs
+        self.panel = None
+        self.tables = {}
+        self.charts = {}
+        self.day = None
+        # Tickers servidos sem dado novo (prazo esgotado ou falha), marcados nas tabelas
+        self.stale = set()
+        # Tickers com mudanças ainda não publicadas; só são esquecidos depois de
+        # uma renderização bem-sucedida
+        self.pending = set()
+
+    def _load(self, start, end, **overrides):
+        options = {**self.data_kwargs, **overrides}
+        return load_price_panel(list(self.registry.tickers()), start, end, **options)
+
+    def poll(self, now=None):
+        # Atualiza o painel e devolve os tickers cujo último fechamento mudou
+        from performance import history_start
+
+        now = now or datetime.now()
+        end = (now + timedelta(days=1)).strftime('%Y-%m-%d')
+
+        if self.panel is None or self.day != now.date():
+            # Primeira consulta ou virada do dia: carrega o histórico completo e recalcula tudo.
+            # O dia só é registrado depois da carga: se ela falhar, a próxima consulta tenta de novo.
+            # O histórico passa pelo cache só até ontem, para não gravar nele o
+            # fechamento parcial de hoje; o dia corrente vem direto da fonte
+            stale = set()
+            today = now.strftime('%Y-%m-%d')
+            panel = self._load(history_start(self.horizons, now), today, stale=stale)
+            current = self._load(today, end, use_cache=False)
+            if len(current.index):
+                panel = current.combine_first(panel).reindex(columns=panel.columns)
+            self.panel = panel
+            self.stale = stale
+            self.day = now.date()
+            return set(self.registry.tickers())
+
+        old_values, old_dates = last_closes(self.panel)
+        # O final da série vai direto à fonte: o cache só é atualizado uma vez por
+        # dia e não deve guardar fechamentos parciais do pregão em andamento
+        stale = set()
+        tail = self._load(self.panel.index[-1] - timedelta(days=TAIL_DAYS), end, use_cache=False, stale=stale)
+        self.panel = tail.combine_first(self.panel).reindex(columns=self.panel.columns)
+        new_values, new_dates = last_closes(self.panel)
+
+        dates_changed = (new_dates != old_dates) & ~(new_dates.isna() & old_dates.isna())
+        values_changed = (new_values != old_values) & ~(new_values.isna() & old_values.isna())
+        changed = dates_changed | values_changed
+        # Tickers que ficaram ou deixaram de ficar defasados também mudam na tabela
+        flipped = self.stale ^ stale
+        self.stale = stale
+        return set(changed[changed].index) | flipped
+
+    def recompute(self, tickers, now=None):
+        # Recalcula apenas as linhas dos tickers informados e devolve as classes afetadas
+        import pandas as pd
+
+        from performance import compute_performance
+
+        now = now or datetime.now()
+        tickers = [t for t in self.registry.tickers() if t in tickers]
+        signs = [self.registry.by_ticker(t).sign for t in tickers]
+        # O painel exclui o dia corrente (como na execução normal), por isso
+        # o cálculo usa o dia seguinte como referência
+        reference = now + timedelta(days=1)
+        with instrumentation.span('watch.compute', tickers=len(tickers)):
+            results = compute_performance(self.panel[tickers], signs, reference, self.horizons)
+        results['Stale'] = results['Moeda'].isin(self.stale)
+
+        affected = set()
+        for asset_class in ('currency', 'commodity'):
+            class_tickers = set(self.registry.tickers(asset_class)) & set(tickers)
+            if not class_tickers:
+                continue
+            rows = results[results['Moeda'].isin(class_tickers)].copy()
+            rows['Moeda'] = self.registry.labels(rows['Moeda'])
+            labels = set(self.registry.labels(class_tickers))
+
+            previous = self.tables.get(asset_class)
+            if previous is not None:
+                rows = pd.concat([previous[~previous['Moeda'].isin(labels)], rows])
+            self.tables[asset_class] = rows.sort_values(by='Performance YTD (%)', ascending=False,
+                                                        ignore_index=True)
+            affected.add(asset_class)
+        return affected
+
+    def render(self, affected):
+        # Re-renderiza só os gráficos das classes afetadas e publica PDF e JSON de forma atômica
+        import report_generator
+
+        builders = {
+            'currency': report_generator.create_enhanced_chart,
+            'commodity': report_generator.create_enhanced_commodities_chart,
+        }
+        for asset_class in affected:
+            with instrumentation.span('watch.chart', asset_class=asset_class):
+                self.charts[asset_class] = builders[asset_class](
+                    self.tables[asset_class], self.chart_format, self.chart_dpi, self.registry).getvalue()
+
+        if self.report_path:
+            from io import BytesIO
+
+            with instrumentation.span('watch.pdf'):
+                buffer = BytesIO()
+                report_generator.create_combined_pdf(BytesIO(self.charts['currency']),
+                                                     BytesIO(self.charts['commodity']),
+                                                     self.tables['currency'], self.tables['commodity'],
+                                                     output_path=buffer, registry=self.registry,
+                                                     chart_format=self.chart_format,
+                                                     chart_dpi=self.chart_dpi)
+                atomic_write(self.report_path, buffer.getvalue())
+
+        if self.json_path:
+            payload = {
+                'updated_at': datetime.now().isoformat(timespec='seconds'),
+                'currencies': json.loads(self.tables['currency'].to_json(orient='records')),
+                'commodities': json.loads(self.tables['commodity'].to_json(orient='records')),
+            }
+            atomic_write(self.json_path, json.dumps(payload, ensure_ascii=False, indent=2).encode('utf-8'))
+
+    def step(self, now=None):
+        # Uma consulta completa: detecta mudanças, recalcula e publica se necessário.
+        # Se o cálculo ou a renderização falharem, as mudanças ficam pendentes e
+        # entram de novo na próxima consulta, mesmo que ela não traga nada novo
+        with instrumentation.span('watch.poll'):
+            self.pending |= self.poll(now)
+        if not self.pending:
+            return set()
+        changed = set(self.pending)
+        affected = self.recompute(changed, now)
+        self.render(affected)
+        self.pending -= changed
+        return changed
+
+    def run(self, interval=DEFAULT_INTERVAL, iterations=None):
+        count = 0
+        while iterations is None or count < iterations:
+            started = time.monotonic()
+            try:
+                changed = self.step()
+                if changed:
+                    print(f"{datetime.now():%H:%M:%S} atualizados: {len(changed)} ativos")
+            except Exception as e:
+                # Uma falha da fonte não derruba o modo contínuo; tenta de novo no próximo ciclo
+                instrumentation.warning(f"falha na atualização ({e})")
+            count += 1
+            if iterations is None or count < iterations:
+                time.sleep(max(0.0, interval - (time.monotonic() - started)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Atualiza o relatório continuamente, só com o que mudou')
+    add_data_arguments(parser)
+    parser.add_argument('--interval', type=float, default=DEFAULT_INTERVAL,
+                        help='segundos entre consultas à fonte de preços')
+    parser.add_argument('--iterations', type=int, help='número de ciclos (padrão: sem limite)')
+    parser.add_argument('--output', default='combined_market_report.pdf', help='PDF publicado a cada atualização')
+    parser.add_argument('--json', help='também publica as tabelas em JSON neste arquivo')
+    parser.add_argument('--chart-format', choices=['vector', 'png'])
+    parser.add_argument('--dpi', type=int)
+    args = parser.parse_args(argv)
+
+    watcher = Watcher(horizons=parse_horizons(args.horizons), report_path=args.output,
+                      json_path=args.json, chart_format=args.chart_format, chart_dpi=args.dpi,
+                      **data_options(args))
+    watcher.run(args.interval, args.iterations)
+
+
+if __name__ == "__main__":
+    main()